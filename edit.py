@@ -1,15 +1,22 @@
 import os
 import json
 import random
+import subprocess
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dotenv import load_dotenv
-from moviepy.editor import (
-    VideoFileClip, AudioFileClip, ImageClip, CompositeVideoClip,
-    CompositeAudioClip, concatenate_videoclips
-)
-from moviepy.video.fx.all import speedx
-from PIL import Image, ImageDraw, ImageFont
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from PIL import Image, ImageFilter, ImageFont
 import numpy as np
 
+try:
+    import orjson  # Optional: faster loading of audio metadata
+except ImportError:
+    orjson = None
+
 
 # Load environment variables
 load_dotenv()
@@ -22,11 +29,29 @@ PERSON_1_IMAGE_PATH = "assets/person_1.png"
 PERSON_2_IMAGE_PATH = "assets/person_2.png"
 
 
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+
+
 # From .env
 USE_CHARACTER_IMAGES = os.getenv("USE_CHARACTER_IMAGES", "yes").lower() == "yes"
+VIDEO_ENCODER = os.getenv("VIDEO_ENCODER", "auto").lower()  # auto, nvenc or libx264
 VIDEO_SPEED = 2.0
+OUTPUT_FPS = 24
 BACKGROUND_MUSIC_VOLUME = 0.5  # 50% volume for background music
+OUTPUT_AUDIO_FORMAT = "sample_rates=44100:channel_layouts=stereo"  # As moviepy wrote it, whatever the TTS engine
 WORDS_PER_LINE = 4  # Number of words to show at once
+SUBTITLE_FONT_SIZE = 20
+SUBTITLE_TEXT_COLOR = (255, 255, 0)  # Yellow
+SUBTITLE_STROKE_COLOR = (0, 0, 0)  # Black
+SUBTITLE_RENDER_WORKERS = min(8, os.cpu_count() or 1)
+NVENC_CODEC_ARGS = ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "0"]
+X264_CODEC_ARGS = ["-c:v", "libx264"]
+X264_THREADS = 4
+X264_PRESET = os.getenv("FFMPEG_PRESET", "veryfast")
+SUBTITLE_FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+)
 
 
 def load_audio_metadata(audio_folder):
@@ -36,12 +61,61 @@ def load_audio_metadata(audio_folder):
     if not os.path.exists(metadata_path):
         raise FileNotFoundError(f"Metadata not found: {metadata_path}")
     
+    if orjson:
+        with open(metadata_path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(metadata_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def resize_image_pil(image_path, target_height):
-    """Resize image using PIL to avoid moviepy compatibility issues"""
+def probe_audio_duration(audio_path):
+    """Get the duration of an audio file without opening a decoder"""
+    try:
+        with wave.open(audio_path, 'rb') as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError):
+        # Not a plain PCM WAV, let ffmpeg read the container header instead
+        return ffmpeg_parse_infos(audio_path)['duration']
+
+
+@lru_cache(maxsize=4)
+def probe_keyframe_times(video_path):
+    """List the keyframe timestamps (seconds from the start) of a video's first stream
+    
+    Uses a framecrc stream copy, which lists packets from the container
+    without decoding; keyframes are the packets printed without an F= flag.
+    Returns an empty list if the video can't be read.
+    """
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", video_path,
+             "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    
+    time_base = None
+    timestamps = []
+    for line in result.stdout.splitlines():
+        if line.startswith("#tb 0:"):
+            num, den = line.split(":", 1)[1].strip().split("/")
+            time_base = int(num) / int(den)
+        elif line and not line.startswith("#") and "F=" not in line and time_base:
+            timestamps.append(int(line.split(",")[2]) * time_base)
+    
+    if not timestamps:
+        return []
+    first = min(timestamps)
+    return sorted(t - first for t in timestamps)
+
+
+def resize_image_pil(image_path, target_height, resample=Image.BICUBIC):
+    """Resize image using PIL to avoid moviepy compatibility issues
+    
+    BICUBIC is indistinguishable from LANCZOS for the small static character
+    overlays and cheaper; pass resample=Image.LANCZOS for higher quality.
+    """
     img = Image.open(image_path)
     
     # Convert to RGBA if not already
@@ -52,115 +126,235 @@ def resize_image_pil(image_path, target_height):
     aspect_ratio = img.width / img.height
     new_width = int(target_height * aspect_ratio)
     
-    # Resize using PIL (LANCZOS is the new name for ANTIALIAS)
-    img_resized = img.resize((new_width, target_height), Image.LANCZOS)
+    # reducing_gap lets Pillow box-reduce large sources before the resample pass
+    img_resized = img.resize((new_width, target_height), resample, reducing_gap=3.0)
     
     return np.array(img_resized)
 
 
-def create_line_image(text, video_size, font_size=20):
-    """Create an image with one line of text"""
-    # Try to use a nice font, fallback to default if not available
-    try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-    except:
+@lru_cache(maxsize=32)
+def _get_font(font_size):
+    """Load the subtitle font at the given size, fallback to default if not available"""
+    for font_path in SUBTITLE_FONT_PATHS:
         try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", font_size)
-        except:
-            font = ImageFont.load_default()
-    
-    # Create temporary image for measuring
-    temp_img = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
-    temp_draw = ImageDraw.Draw(temp_img)
+            return ImageFont.truetype(font_path, font_size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+# Warm the font cache so the first subtitle chunk doesn't pay for opening the face
+_get_font(SUBTITLE_FONT_SIZE)
+
+
+# Float colors for blending subtitle text over its stroke
+_SUBTITLE_STROKE_RGB = np.array(SUBTITLE_STROKE_COLOR, dtype=np.float32)
+_SUBTITLE_COLOR_DELTA = np.array(SUBTITLE_TEXT_COLOR, dtype=np.float32) - _SUBTITLE_STROKE_RGB
+
+
+@lru_cache(maxsize=512)
+def create_line_image(text, video_width, font_size=SUBTITLE_FONT_SIZE):
+    """Create an RGBA array with one line of text (cached per text/width/size)"""
+    font = _get_font(font_size)
     
-    # Get text dimensions
-    text_bbox = temp_draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
+    # Rasterize and measure the text in a single FreeType layout call
+    mask, (offset_x, offset_y) = font.getmask2(text, mode='L')
+    text_width, text_height = mask.size
     
     # Make sure text doesn't exceed 80% of video width
-    max_width = int(video_size[0] * 0.8)
-    if text_width > max_width:
-        # Reduce font size if text is too wide
-        while text_width > max_width and font_size > 12:
-            font_size -= 1
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-            except:
-                try:
-                    font = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", font_size)
-                except:
-                    font = ImageFont.load_default()
-            text_bbox = temp_draw.textbbox((0, 0), text, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
+    max_width = int(video_width * 0.8)
+    if text_width > max_width and font_size > 12:
+        # Binary search the largest font size (down to 12) whose text still fits
+        low, high = 12, font_size - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            mid_bbox = _get_font(mid).getbbox(text)
+            if mid_bbox[2] - mid_bbox[0] <= max_width:
+                low = mid
+            else:
+                high = mid - 1
+        
+        font_size = low
+        font = _get_font(font_size)
+        mask, (offset_x, offset_y) = font.getmask2(text, mode='L')
+        text_width, text_height = mask.size
     
     padding_horizontal = 15
     padding_vertical = 8
     stroke_width = 2
     
-    # Create compact image
-    img_width = text_width + (padding_horizontal * 2) + (stroke_width * 2)
-    img_height = text_height + (padding_vertical * 2) + (stroke_width * 2)
-    
-    # Create image
-    img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    
     # Center the text
     x = padding_horizontal + stroke_width
     y = padding_vertical + stroke_width
     
-    # Draw stroke (black outline)
-    for adj_x in range(-stroke_width, stroke_width + 1):
-        for adj_y in range(-stroke_width, stroke_width + 1):
-            draw.text((x + adj_x, y + adj_y), text, font=font, fill='black')
-    
-    # Draw main text in yellow
-    draw.text((x, y), text, font=font, fill='yellow')
-    
-    return img
+    # The mask sits offset from the draw origin (e.g. "..." drops to the baseline),
+    # so size the compact image from where it actually lands
+    left = max(0, x + offset_x)
+    top = max(0, y + offset_y)
+    img_width = left + text_width + padding_horizontal + stroke_width
+    img_height = top + text_height + padding_vertical + stroke_width
+    
+    # Place the glyph mask into a padded alpha mask
+    padded_mask = np.zeros((img_height, img_width), dtype=np.uint8)
+    padded_mask[top:top + text_height, left:left + text_width] = np.asarray(mask).reshape(text_height, text_width)
+    text_mask = Image.fromarray(padded_mask)
+    
+    # Build the stroke (black outline) by dilating the mask in a single pass
+    # instead of redrawing the text at every (2*stroke+1)^2 offset
+    outline_mask = text_mask.filter(ImageFilter.MaxFilter(stroke_width * 2 + 1))
+    
+    # Blend text color over stroke color in one vectorized pass:
+    # rgb = stroke + coverage * (text - stroke)
+    text_alpha = np.asarray(text_mask, dtype=np.float32) * (1 / 255)
+    img_array = np.empty((img_height, img_width, 4), dtype=np.uint8)
+    img_array[..., :3] = text_alpha[..., None] * _SUBTITLE_COLOR_DELTA + _SUBTITLE_STROKE_RGB + 0.5
+    # The dilated outline covers the text, so it is the combined alpha
+    img_array[..., 3] = np.asarray(outline_mask)
+    
+    # Cached arrays are shared between clips, so keep them read-only
+    img_array.flags.writeable = False
+    
+    return img_array
 
 
-def create_animated_subtitle_clips(text, duration, video_size):
-    """Create animated subtitle clips showing chunks of words that change"""
+def split_subtitle_chunks(text):
+    """Split dialogue text into chunks of WORDS_PER_LINE words"""
     words = text.split()
-    num_words = len(words)
-    
-    if num_words == 0:
-        return []
-    
-    # Create chunks of words
-    chunks = []
-    for i in range(0, num_words, WORDS_PER_LINE):
-        chunk = " ".join(words[i:i + WORDS_PER_LINE])
-        chunks.append(chunk)
+    return [" ".join(words[i:i + WORDS_PER_LINE]) for i in range(0, len(words), WORDS_PER_LINE)]
+
+
+def build_subtitle_arrays(chunk_lists, video_size):
+    """Rasterize every unique subtitle chunk across all lines once"""
+    unique_chunks = sorted({chunk for chunks in chunk_lists for chunk in chunks})
     
-    # Calculate time per chunk
-    time_per_chunk = duration / len(chunks)
+    def render(chunk):
+        return create_line_image(chunk, video_size[0], SUBTITLE_FONT_SIZE)
     
-    clips = []
+    # Pillow's filter pass and the NumPy compose release the GIL, so threads scale
+    # and results land in create_line_image's cache without any pickling
+    if SUBTITLE_RENDER_WORKERS > 1 and len(unique_chunks) > 1:
+        with ThreadPoolExecutor(max_workers=SUBTITLE_RENDER_WORKERS) as executor:
+            return dict(zip(unique_chunks, executor.map(render, unique_chunks)))
     
-    for chunk in chunks:
-        # Create image with this line of text
-        pil_img = create_line_image(chunk, video_size, font_size=20)
-        
-        # Convert PIL image to numpy array
-        img_array = np.array(pil_img)
-        
-        # Create ImageClip
-        clip = ImageClip(img_array).set_duration(time_per_chunk)
+    return {chunk: render(chunk) for chunk in unique_chunks}
+
+
+@lru_cache(maxsize=1)
+def nvenc_available():
+    """Check whether ffmpeg has a working h264_nvenc encoder (NVIDIA GPU)"""
+    try:
+        encoders = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-encoders"],
+            capture_output=True, text=True, timeout=30
+        ).stdout
+        if "h264_nvenc" not in encoders:
+            return False
         
-        # Position in center of screen
-        clip = clip.set_position('center')
+        # The encoder can be compiled in without a usable GPU, so try a tiny encode
+        test = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+             "-c:v", "h264_nvenc", "-f", "null", "-"],
+            capture_output=True, timeout=30
+        )
+        return test.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def get_video_codec_args(threads=None, preset=None):
+    """Return the ffmpeg video encoder arguments, preferring NVENC when available
+    
+    threads and preset only apply to libx264; NVENC keeps its own preset.
+    """
+    if VIDEO_ENCODER == "nvenc" or (VIDEO_ENCODER == "auto" and nvenc_available()):
+        return NVENC_CODEC_ARGS
+    return X264_CODEC_ARGS + ["-preset", preset or X264_PRESET, "-threads", str(threads or X264_THREADS)]
+
+
+def write_overlay_png(img_array, path):
+    """Write an RGBA overlay array to a PNG file for ffmpeg"""
+    Image.fromarray(img_array).save(path)
+    return path
+
+
+def build_subtitle_atlas(subtitle_arrays):
+    """Stack subtitle chunk images into one atlas of equally sized, centered cells
+    
+    Args:
+        subtitle_arrays: Dict mapping chunk text to its RGBA image array
+    
+    Returns:
+        tuple: (atlas array, (cell_width, cell_height), dict mapping chunk text to its row)
+    """
+    cell_height = max(img.shape[0] for img in subtitle_arrays.values())
+    cell_width = max(img.shape[1] for img in subtitle_arrays.values())
+    
+    atlas = np.zeros((cell_height * len(subtitle_arrays), cell_width, 4), dtype=np.uint8)
+    rows = {}
+    for row, (chunk, img) in enumerate(subtitle_arrays.items()):
+        height, width = img.shape[:2]
+        top = row * cell_height + (cell_height - height) // 2
+        left = (cell_width - width) // 2
+        atlas[top:top + height, left:left + width] = img
+        rows[chunk] = row
+    
+    return atlas, (cell_width, cell_height), rows
+
+
+def build_filter_complex(overlays, dialogue_count):
+    """Build the ffmpeg filter graph for the background, overlays and audio mix
+    
+    Inputs are expected in the order: background video, looped background
+    music, one input per dialogue line, then the overlay images.
+    
+    Args:
+        overlays: List of (image_index, image_filter, x, y, windows) tuples, where
+            image_filter is an optional filter chain applied to the image before
+            overlaying and windows is a list of (start, end) times it is shown
+        dialogue_count: Number of dialogue audio inputs
+    
+    Returns:
+        tuple: (filter_complex string, video stream label, audio stream label)
+    """
+    # The background segment is already cut by input seeking, only rescale timestamps
+    filters = [
+        f"[0:v]setpts=(PTS-STARTPTS)/{VIDEO_SPEED},"
+        # Hold the last frame if the background is shorter than the audio
+        f"tpad=stop_mode=clone:stop=-1[bg]"
+    ]
+    
+    first_image_input = 2 + dialogue_count
+    current = "[bg]"
+    for n, (image_index, image_filter, x, y, windows) in enumerate(overlays):
+        stream = f"[{image_index + first_image_input}:v]"
+        if image_filter:
+            filters.append(f"{stream}{image_filter}[img{n}]")
+            stream = f"[img{n}]"
         
-        clips.append(clip)
-    
-    return clips
+        output = f"[v{n}]"
+        enable = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in windows)
+        filters.append(f"{current}{stream}overlay=x={x}:y={y}:enable='{enable}'{output}")
+        current = output
+    
+    # Join the dialogue lines back to back; the concat filter decodes each input,
+    # so lines from different TTS backends may differ in sample rate or layout
+    dialogue_inputs = "".join(f"[{n + 2}:a]" for n in range(dialogue_count))
+    filters.append(f"{dialogue_inputs}concat=n={dialogue_count}:v=0:a=1[dialogue]")
+    
+    # Mix dialogue with the (already looped) background music at reduced volume
+    filters.append(f"[1:a]volume={BACKGROUND_MUSIC_VOLUME}[music]")
+    # amix takes its format from the first dialogue line (mono 24 kHz for Kokoro)
+    filters.append(f"[dialogue][music]amix=inputs=2:duration=first:normalize=0,aformat={OUTPUT_AUDIO_FORMAT}[aout]")
+    
+    return ";".join(filters), current, "[aout]"
 
 
-def create_video_with_audio(audio_folder, output_filename="final_video.mp4"):
-    """Create the final video with all elements"""
+def create_video_with_audio(audio_folder, output_filename="final_video.mp4", ffmpeg_threads=None, preset=None):
+    """Create the final video with all elements
+    
+    ffmpeg_threads and preset override the libx264 defaults (X264_THREADS, X264_PRESET).
+    """
     
     print(f"\n{'='*60}")
     print("Starting video creation...")
@@ -170,48 +364,52 @@ def create_video_with_audio(audio_folder, output_filename="final_video.mp4"):
     print("Loading audio metadata...")
     metadata = load_audio_metadata(audio_folder)
     
-    # Load background video
-    print("Loading background video...")
-    background_video = VideoFileClip(BACKGROUND_VIDEO_PATH)
+    # Probe background video (reads the container header only, no decoding)
+    print("Probing background video...")
+    background_info = ffmpeg_parse_infos(BACKGROUND_VIDEO_PATH)
     
-    # Get the total duration of the background video
-    background_duration = background_video.duration
+    # Get the total duration and size of the background video
+    background_duration = background_info['duration']
+    video_size = background_info['video_size']
     print(f"Background video duration: {background_duration:.2f}s")
     
-    # Calculate total audio duration
+    # Resolve each line's audio file, start offset, duration and subtitle chunks in a single pass
     total_audio_duration = 0
-    audio_clips = []
+    segments = []
     
     for item in metadata:
         audio_path = os.path.join(audio_folder, item['audio_file'])
-        audio_clip = AudioFileClip(audio_path)
-        audio_clips.append(audio_clip)
-        total_audio_duration += audio_clip.duration
+        duration = probe_audio_duration(audio_path)
+        chunks = split_subtitle_chunks(item['text'])
+        segments.append((item, audio_path, total_audio_duration, duration, chunks))
+        total_audio_duration += duration
+    
+    if not segments:
+        raise ValueError(f"No audio clips listed in metadata: {audio_folder}")
     
     print(f"Total audio duration: {total_audio_duration:.2f}s")
     
-    # Calculate how much video we need
-    video_needed_duration = total_audio_duration / VIDEO_SPEED
+    # Calculate how much source video we need (it is played back VIDEO_SPEED times faster)
+    video_needed_duration = total_audio_duration * VIDEO_SPEED
     
     # Calculate the maximum possible random start time
     max_start_time = background_duration - video_needed_duration
     
-    # Generate a random start time (ensure it's not negative)
+    # Generate a random start time (ensure it's not negative), on a keyframe when
+    # possible so the input seek starts decoding exactly where the segment begins
     if max_start_time > 0:
-        random_start_time = random.randint(0, int(max_start_time))
+        keyframes = [k for k in probe_keyframe_times(BACKGROUND_VIDEO_PATH) if k <= max_start_time]
+        if keyframes:
+            random_start_time = random.choice(keyframes)
+        else:
+            random_start_time = random.randint(0, int(max_start_time))
     else:
         random_start_time = 0
         print("Warning: Audio duration exceeds available background video!")
     
-    print(f"Randomly selected start time: {random_start_time}s at {VIDEO_SPEED}x speed")
-    print(f"Using video segment from {random_start_time}s to {random_start_time + video_needed_duration:.2f}s")
+    print(f"Randomly selected start time: {random_start_time:.2f}s at {VIDEO_SPEED}x speed")
+    print(f"Using video segment from {random_start_time:.2f}s to {random_start_time + video_needed_duration:.2f}s")
     
-    # Extract and speed up background video from random position
-    background_video = background_video.subclip(random_start_time, random_start_time + video_needed_duration)
-    background_video = speedx(background_video, VIDEO_SPEED)
-    background_video = background_video.set_duration(total_audio_duration)
-    
-    video_size = background_video.size
     print(f"Video size: {video_size[0]}x{video_size[1]}")
     
     # Load and resize character images if enabled
@@ -237,38 +435,74 @@ def create_video_with_audio(audio_folder, output_filename="final_video.mp4"):
         else:
             print(f"✗ Person 2 image not found: {PERSON_2_IMAGE_PATH}")
     
-    # Create video segments with subtitles and character images
-    print("\nCreating video segments...")
-    current_time = 0
-    all_clips = [background_video]
+    # Pre-render each unique subtitle chunk once
+    print("\nRendering subtitle images...")
+    subtitle_arrays = build_subtitle_arrays([segment[4] for segment in segments], video_size)
+    print(f"✓ Rendered {len(subtitle_arrays)} unique subtitle chunks")
     
-    for idx, item in enumerate(metadata):
-        audio_path = os.path.join(audio_folder, item['audio_file'])
-        audio_clip = AudioFileClip(audio_path)
-        duration = audio_clip.duration
+    # Create output folder
+    output_folder = os.path.join("final_videos", os.path.basename(audio_folder))
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, output_filename)
+    
+    with tempfile.TemporaryDirectory(prefix="overlays_", dir=output_folder) as temp_dir:
+        # All subtitle chunks share one atlas image, so a single overlay shows every chunk
+        atlas, (cell_width, cell_height), atlas_rows = build_subtitle_atlas(subtitle_arrays)
+        image_paths = [write_overlay_png(atlas, os.path.join(temp_dir, "subtitle_atlas.png"))]
         
-        speaker = item['speaker']
-        text = item['text']
+        character_inputs = {}
+        for speaker, img_array in character_images.items():
+            character_inputs[speaker] = len(image_paths)
+            image_paths.append(write_overlay_png(img_array, os.path.join(temp_dir, f"{speaker.replace(' ', '_').lower()}.png")))
         
-        print(f"[{idx + 1}/{len(metadata)}] Scene {item['scene_id']}, {speaker}: {text[:50]}...")
+        # Build the overlay timeline with subtitles and character images
+        print("\nCreating video segments...")
+        overlays = []
+        subtitle_windows = []
+        character_windows = {}
         
-        # Create animated subtitle clips (chunks of words)
-        subtitle_clips = create_animated_subtitle_clips(text, duration, video_size)
+        for idx, (item, _, start_time, duration, chunks) in enumerate(segments):
+            speaker = item['speaker']
+            text = item['text']
+            
+            print(f"[{idx + 1}/{len(metadata)}] Scene {item['scene_id']}, {speaker}: {text[:50]}...")
+            
+            # Show each chunk of words for an equal share of the line
+            if chunks:
+                time_per_chunk = duration / len(chunks)
+                for chunk_idx, chunk in enumerate(chunks):
+                    chunk_start = start_time + chunk_idx * time_per_chunk
+                    subtitle_windows.append((atlas_rows[chunk], chunk_start, chunk_start + time_per_chunk))
+            
+            # Record when the character image is shown, if enabled
+            if USE_CHARACTER_IMAGES and speaker in character_images:
+                windows = character_windows.setdefault(speaker, [])
+                if windows and abs(windows[-1][1] - start_time) < 1e-6:
+                    # Same speaker continues, extend the previous window
+                    windows[-1] = (windows[-1][0], start_time + duration)
+                else:
+                    windows.append((start_time, start_time + duration))
         
-        # Add each subtitle clip with proper timing
-        subtitle_current_time = current_time
-        for subtitle_clip in subtitle_clips:
-            subtitle_clip = subtitle_clip.set_start(subtitle_current_time)
-            all_clips.append(subtitle_clip)
-            subtitle_current_time += subtitle_clip.duration
+        if subtitle_windows:
+            # Repeat the atlas frame and crop the active chunk's row at each timestamp;
+            # half-open windows keep the row sum unambiguous where chunks meet
+            row_expr = "+".join(
+                f"{row}*gte(t,{start:.3f})*lt(t,{end:.3f})"
+                for row, start, end in subtitle_windows if row
+            ) or "0"
+            atlas_filter = (
+                f"loop=loop=-1:size=1,setpts=N/{OUTPUT_FPS}/TB,"
+                f"crop={cell_width}:{cell_height}:0:'{cell_height}*({row_expr})'"
+            )
+            overlays.append((
+                0, atlas_filter, f"(W-{cell_width})/2", f"(H-{cell_height})/2",
+                [(start, end) for _, start, end in subtitle_windows]
+            ))
         
-        # Add character image if enabled
-        if USE_CHARACTER_IMAGES and speaker in character_images:
+        # One overlay per character, enabled during all of that speaker's lines
+        for speaker, windows in character_windows.items():
             char_img_array = character_images[speaker]
             
-            # Create character image clip from numpy array
-            char_clip = ImageClip(char_img_array).set_duration(duration)
-            
             # Position based on speaker
             if speaker == "Person 1":
                 # Lower-left corner
@@ -279,64 +513,46 @@ def create_video_with_audio(audio_folder, output_filename="final_video.mp4"):
                 x_pos = video_size[0] - char_img_array.shape[1] - 50
                 y_pos = video_size[1] - char_img_array.shape[0] - 50
             
-            char_clip = char_clip.set_position((x_pos, y_pos))
-            char_clip = char_clip.set_start(current_time)
-            all_clips.append(char_clip)
+            overlays.append((character_inputs[speaker], None, x_pos, y_pos, windows))
         
-        current_time += duration
-    
-    # Composite all video clips
-    print("\nCompositing video clips...")
-    final_video = CompositeVideoClip(all_clips, size=video_size)
-    
-    # Concatenate all audio clips
-    print("Concatenating audio clips...")
-    concatenated_audio = concatenate_audioclips(audio_clips)
-    
-    # Add background music
-    print("Adding background music...")
-    background_music = AudioFileClip(BACKGROUND_MUSIC_PATH)
-    background_music = background_music.volumex(BACKGROUND_MUSIC_VOLUME)
-    
-    # Loop background music if needed
-    if background_music.duration < total_audio_duration:
-        loops_needed = int(total_audio_duration / background_music.duration) + 1
-        background_music = concatenate_audioclips([background_music] * loops_needed)
-    
-    background_music = background_music.subclip(0, total_audio_duration)
-    
-    # Mix audio: dialogue + background music
-    final_audio = CompositeAudioClip([concatenated_audio, background_music])
-    final_video = final_video.set_audio(final_audio)
-    
-    # Set duration
-    final_video = final_video.set_duration(total_audio_duration)
-    
-    # Create output folder
-    output_folder = os.path.join("final_videos", os.path.basename(audio_folder))
-    os.makedirs(output_folder, exist_ok=True)
-    output_path = os.path.join(output_folder, output_filename)
-    
-    # Write video
-    print(f"\nWriting final video to: {output_path}")
-    print("This may take a few minutes...")
-    
-    final_video.write_videofile(
-        output_path,
-        fps=24,
-        codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        threads=4
-    )
-    
-    # Cleanup
-    print("\nCleaning up...")
-    for clip in audio_clips:
-        clip.close()
-    background_video.close()
-    final_video.close()
+        # Composite background, overlays and audio in a single ffmpeg pass
+        print("\nCompositing video and audio with ffmpeg...")
+        filter_complex, video_label, audio_label = build_filter_complex(
+            overlays, len(segments)
+        )
+        
+        codec_args = get_video_codec_args(ffmpeg_threads, preset)
+        print(f"✓ Video encoder: {codec_args[1]}")
+        
+        # Input-side -ss seeks via the keyframe index instead of decoding up to the start
+        cmd = [
+            FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error", "-stats",
+            "-ss", f"{random_start_time:.3f}", "-t", f"{video_needed_duration:.3f}",
+            "-i", BACKGROUND_VIDEO_PATH,
+            # Background music is looped by ffmpeg and cut by amix to the dialogue length
+            "-stream_loop", "-1", "-i", BACKGROUND_MUSIC_PATH,
+        ]
+        for _, audio_path, _, _, _ in segments:
+            cmd += ["-i", audio_path]
+        for image_path in image_paths:
+            cmd += ["-i", image_path]
+        cmd += [
+            "-filter_complex", filter_complex,
+            "-map", video_label,
+            "-map", audio_label,
+            "-t", f"{total_audio_duration:.3f}",
+            "-r", str(OUTPUT_FPS),
+            *codec_args,
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+            output_path,
+        ]
+        
+        # Write video
+        print(f"\nWriting final video to: {output_path}")
+        print("This may take a few minutes...")
+        
+        subprocess.run(cmd, check=True)
     
     print(f"\n{'='*60}")
     print(f"✓ Video creation complete!")
@@ -352,33 +568,16 @@ def find_latest_audio_folder(base_folder="audio_output"):
     if not os.path.exists(base_folder):
         return None
     
-    folders = [f for f in os.listdir(base_folder) if os.path.isdir(os.path.join(base_folder, f))]
-    
-    if not folders:
-        return None
-    
-    latest_folder = max(
-        folders,
-        key=lambda f: os.path.getmtime(os.path.join(base_folder, f))
-    )
-    
-    return os.path.join(base_folder, latest_folder)
-
-
-def concatenate_audioclips(clips):
-    """Concatenate audio clips sequentially"""
-    if not clips:
-        return None
-    
-    current_time = 0
-    audio_clips_with_timing = []
-    
-    for clip in clips:
-        clip_with_start = clip.set_start(current_time)
-        audio_clips_with_timing.append(clip_with_start)
-        current_time += clip.duration
+    # is_dir() uses the entry type from the directory read; only the mtime needs a stat
+    with os.scandir(base_folder) as entries:
+        folders = [entry for entry in entries if entry.is_dir()]
+        
+        if not folders:
+            return None
+        
+        latest_folder = max(folders, key=lambda entry: entry.stat().st_mtime_ns)
     
-    return CompositeAudioClip(audio_clips_with_timing)
+    return latest_folder.path
 
 
 if __name__ == "__main__":
@@ -1,14 +1,287 @@
 import os
 import json
+import atexit
+import hashlib
+import io
+import logging
+import queue
+import random
+import re
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
-from openai import OpenAI
 import sys
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson  # Optional: faster JSON load/save for the ideas file
+except ImportError:
+    orjson = None
+
+try:
+    from filelock import FileLock  # Optional: guards ideas.json against other processes
+except ImportError:
+    FileLock = None
+
+try:
+    import fcntl  # POSIX fallback for the cross-process lock when filelock isn't installed
+except ImportError:
+    fcntl = None
+
+
+# Characters of each API response shown as a preview
+PREVIEW_CHARS = 500
+
+# Files above this size are scanned as a stream instead of loaded whole
+LARGE_IDEAS_FILE_BYTES = 10 * 1024 * 1024
+SCAN_CHUNK_CHARS = 1 << 20
+
+# Step outputs are checkpointed here so a failed run can resume without new API calls
+CHECKPOINT_DIR = '.cache'
+CHECKPOINT_TTL = 3600  # Seconds
 
 
 # Load environment variables from .env file
 load_dotenv()
 
 
+log = logging.getLogger(__name__)
+
+
+def _setup_logging():
+    """Send this module's log records through a queue so a background thread writes them"""
+    if log.handlers:
+        return
+    
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    
+    log.addHandler(QueueHandler(log_queue))
+    log.setLevel(logging.DEBUG if os.getenv('DEBUG') else logging.INFO)
+    log.propagate = False
+
+
+_setup_logging()
+
+
+# Retry settings for transient API errors, before falling back to another provider
+CHAT_MAX_ATTEMPTS = 3
+CHAT_RETRY_MAX_WAIT = 10  # Seconds
+
+# Send the idea generation request to two providers at once and keep the first answer
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'no').lower() == 'yes'
+
+# Number of concurrent generation requests, each scoped to one category; 1 keeps a single request
+PARALLEL_IDEA_CALLS = int(os.getenv('PARALLEL_IDEA_CALLS', '1'))
+IDEAS_PER_CATEGORY = 2
+IDEA_CATEGORIES = [
+    "science", "history", "unsolved mysteries", "technology",
+    "surprising human-interest stories", "oddities",
+]
+
+# Ideas per ranking request; larger sets are split and the batches ranked concurrently.
+# 0 ranks every idea in a single request
+RANKING_BATCH_SIZE = int(os.getenv('RANKING_BATCH_SIZE', '0'))
+
+# Ranking backend: 'llm' asks the model to score the ideas, 'local' scores them
+# on this machine with text features and embeddings, skipping one API round trip
+IDEA_RANKER = os.getenv('IDEA_RANKER', 'llm').lower()
+
+# Opt in to generating and ranking the ideas in one structured request instead of two;
+# applies only with the LLM ranker and a single generation request, when the provider supports it
+COMBINED_IDEA_CALL = (
+    os.getenv('COMBINED_IDEA_CALL', 'no').lower() == 'yes'
+    and IDEA_RANKER == 'llm' and PARALLEL_IDEA_CALLS == 1
+)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+HASHED_EMBEDDING_DIM = 512  # Used when sentence-transformers isn't installed
+EMBEDDING_THREADS = max(1, (os.cpu_count() or 2) // 2)  # Leave cores for serialization and I/O
+DUPLICATE_SIMILARITY = float(os.getenv('DUPLICATE_SIMILARITY', '0.85'))
+EMBEDDINGS_SIDECAR_SUFFIX = '.embeddings.npy'  # Stored next to ideas.json, one row per idea
+# Drop new ideas too similar to saved ones; on with the local ranker, which embeds them anyway
+DEDUPLICATE_IDEAS = os.getenv('DEDUPLICATE_IDEAS', 'no').lower() == 'yes' or IDEA_RANKER == 'local'
+HOOK_WORDS = re.compile(
+    r"\b(why|how|what|secret|mystery|hidden|never|first|only|real|truth|strange|"
+    r"lost|impossible|deadliest|largest|smallest|forgotten|accident|shocking)\b",
+    re.IGNORECASE
+)
+
+# Structured output schema for OpenAI-compatible providers. Strict schemas need an
+# object at the root, so the ideas array is wrapped in {"ideas": [...]}
+IDEA_FIELDS = [
+    "id", "idea", "caption", "channel_style_prompt", "character_style_prompt",
+    "production_status", "final_output", "publishing_status", "error_log",
+]
+IDEAS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ideas",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "ideas": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            field: {"type": "integer" if field == "id" else "string"}
+                            for field in IDEA_FIELDS
+                        },
+                        "required": IDEA_FIELDS,
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["ideas"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Providers to try, in order, when the primary one is unavailable
+FALLBACK_PROVIDERS = {
+    'NVIDIA': ['G4F', 'OPENAI'],
+    'G4F': ['NVIDIA', 'OPENAI'],
+    'OPENAI': ['NVIDIA', 'G4F'],
+}
+
+
+# Static instructions are sent as the system message so providers can cache the prompt prefix
+IDEA_GENERATION_PROMPT = """Create a JSON array with 5–10 short-form video content ideas optimized for TikTok, Instagram Reels, and YouTube Shorts, suitable for a general knowledge or storytelling channel.
+
+
+Requirements:
+- Ensure diversity across science, history, unsolved mysteries, technology, surprising human-interest stories, and oddities. Cover at least 5 different categories overall.
+- Each idea must be anchored in a specific interesting fact, lesser-known story, or fascinating concept that can be explained in 20–45 seconds.
+- idea: Write a strong hook-style title (4–8 words), no clickbait, clear capitalization, minimal punctuation.
+- caption: One compelling sentence that teases the twist or key takeaway and sets a hook-first narrative.
+- channel_style_prompt: Concise, comma-separated keywords for theme and editing style suited to vertical short-form content, e.g., vertical video, fast paced, b roll, text captions, sound effects, dramatic reveal, educational, voiceover.
+- character_style_prompt: A vivid, visual prompt for a key image or character tied to the idea (include age, attire, setting, lighting, mood, camera angle, color palette).
+- production_status: Always set to for production.
+- final_output: Leave blank (empty string).
+- publishing_status: Always set to pending.
+- error_log: Leave blank (empty string).
+- Language: English.
+- Safety: Avoid sensationalism and harmful content; keep facts accurate. If speculative, use words like theory or legend in the caption.
+- IMPORTANT: Output ONLY valid JSON with proper double quotes around all keys and string values.
+- Do not add any commentary before or after the JSON.
+
+
+Output format: A JSON array of objects with these exact fields:
+id, idea, caption, channel_style_prompt, character_style_prompt, production_status, final_output, publishing_status, error_log
+
+
+Constraints:
+- id is a unique integer starting at 1.
+- Do not repeat the same subtopic; ensure variety across entries.
+- Optimize all ideas for vertical short-form pacing with a 3–5 second hook.
+- Output valid JSON only with properly escaped quotes if needed."""
+
+RANKING_PROMPT = """Analyze and rank all provided short-form video ideas based on the following criteria. Output ONLY the top-ranked ideas in JSON format matching the original input structure.
+
+
+Evaluation Criteria (Score each 1-10):
+
+
+1. hook_strength: Does the title and caption immediately grab attention within 3 seconds? Is the hook curiosity-driven and specific?
+
+
+2. viral_potential: Likelihood of shares, saves, and rewatches based on uniqueness, emotional trigger, or surprise factor.
+
+
+3. production_feasibility: Can this be produced with accessible resources? Does the character_style_prompt provide clear visual direction?
+
+
+4. educational_value: Does it deliver a satisfying payoff? Is the fact or story genuinely interesting and memorable?
+
+
+5. platform_optimization: Is it optimized for vertical video pacing (20-45 seconds)? Does the channel_style_prompt match short-form best practices?
+
+
+6. engagement_trigger: Does it spark comments, debates, or emotional reactions (wonder, curiosity, shock)?
+
+
+Ranking Process:
+- Calculate total_score for each idea (sum of all 6 criteria, max 60 points)
+- Rank all ideas from highest to lowest total_score
+- For ties, prioritize hook_strength, then viral_potential
+- Select only ideas with total_score >= 45 (top-tier ideas)
+- If fewer than 3 ideas score >= 45, output the top 3 ideas regardless of score
+
+
+Output Format (JSON array):
+[
+  {
+    "id": 1,
+    "idea": "<original_idea_title>",
+    "caption": "<original_caption>",
+    "channel_style_prompt": "<original_channel_style_prompt>",
+    "character_style_prompt": "<original_character_style_prompt>",
+    "production_status": "for production",
+    "final_output": "",
+    "publishing_status": "pending",
+    "error_log": ""
+  }
+]
+
+
+Requirements:
+- Output ONLY valid JSON array with no additional text, markdown, or commentary
+- Preserve all original field values exactly as provided in the input
+- Order array from highest ranked to lowest ranked
+- Include only top-performing ideas based on scoring threshold
+- Ensure JSON is parseable by Python json.loads()"""
+
+# Both sets of instructions for COMBINED_IDEA_CALL, so one request does the work of two
+GENERATE_AND_RANK_PROMPT = (
+    IDEA_GENERATION_PROMPT
+    + "\n\n\nBefore answering, rank the ideas you created as described below and output "
+    + "only the selected ones, best first.\n\n\n"
+    + RANKING_PROMPT
+)
+
+# Per-request user messages that follow the static system prompts
+IDEA_GENERATION_REQUEST = "Generate the video ideas now."
+CATEGORY_REQUEST_TEMPLATE = "For this request, create exactly {count} ideas, all in the category: {category}."
+RANKING_REQUEST_TEMPLATE = "Here are the ideas to rank:\n\n{ideas_json}"
+
+
+_shared_http_client = None
+_shared_http_lock = threading.Lock()
+
+
+def shared_http_client():
+    """Return the keep-alive connection pool shared by every OpenAI-compatible client in the process
+    
+    Idea generation and storyboards talk to the same provider, so they reuse
+    each other's connections instead of paying a TLS handshake per client.
+    HTTP/2 is used when the h2 package is installed. The pool is closed at exit.
+    """
+    global _shared_http_client
+    with _shared_http_lock:
+        if _shared_http_client is None:
+            import httpx
+            from importlib.util import find_spec
+            _shared_http_client = httpx.Client(
+                timeout=httpx.Timeout(600.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=32),
+                http2=find_spec('h2') is not None
+            )
+            atexit.register(_shared_http_client.close)
+        return _shared_http_client
+
+
 class APIProviderManager:
     """Manages multiple API providers with automatic fallback"""
     
@@ -18,6 +291,41 @@ class APIProviderManager:
         self.current_provider = None
         self.model = None
         self.client_type = None  # Track client type: 'g4f' or 'openai'
+        self._clients = {}  # Provider name -> client, reused across fallbacks and retries
+        self._no_response_format = set()  # Providers that rejected structured output
+        # Guards the (client, model, current_provider, client_type) switch; each request
+        # works from a snapshot, so a fallback in one thread can't swap another's client
+        self._provider_lock = threading.Lock()
+    
+    def _active_provider(self):
+        """Snapshot of the (client, model, provider_name, client_type) requests should use"""
+        with self._provider_lock:
+            return self.client, self.model, self.current_provider, self.client_type
+    
+    def _switch_provider(self, provider, replacing=None):
+        """Make provider the current one, unless another thread already moved off replacing
+        
+        Returns:
+            bool: Whether the switch happened
+        """
+        with self._provider_lock:
+            if replacing is not None and self.current_provider != replacing[2]:
+                return False
+            self.client, self.model, self.current_provider, self.client_type = provider
+            return True
+    
+    def close(self):
+        """Drop this manager's clients; the shared connection pool stays open until exit"""
+        self._clients.clear()
+        self.client = None
+    
+    def supports_structured_output(self):
+        """Whether the current provider accepts a JSON schema response format"""
+        return self.client_type == 'openai' and self.current_provider not in self._no_response_format
+    
+    def is_healthy(self):
+        """Whether a provider is set up and its client hasn't been closed"""
+        return self.client is not None
         
     def get_nvidia_client(self):
         """Initialize NVIDIA NIM API client"""
@@ -27,10 +335,15 @@ class APIProviderManager:
         if not api_key:
             raise ValueError("NVIDIA_API_KEY not found in environment variables")
         
-        client = OpenAI(
-            base_url="https://integrate.api.nvidia.com/v1",
-            api_key=api_key
-        )
+        client = self._clients.get('NVIDIA')
+        if client is None:
+            from openai import OpenAI  # Deferred: the SDK is slow to import
+            client = OpenAI(
+                base_url="https://integrate.api.nvidia.com/v1",
+                api_key=api_key,
+                http_client=shared_http_client()
+            )
+            self._clients['NVIDIA'] = client
         return client, model, 'NVIDIA', 'openai'
     
     def get_g4f_client(self):
@@ -47,7 +360,10 @@ class APIProviderManager:
         model = os.getenv('G4F_MODEL', 'gpt-4o-mini')
         
         # Use native g4f client
-        client = Client()
+        client = self._clients.get('G4F')
+        if client is None:
+            client = Client()
+            self._clients['G4F'] = client
         return client, model, 'G4F', 'g4f'
     
     def get_openai_client(self):
@@ -59,10 +375,15 @@ class APIProviderManager:
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        client = OpenAI(
-            base_url=base_url,
-            api_key=api_key
-        )
+        client = self._clients.get('OPENAI')
+        if client is None:
+            from openai import OpenAI  # Deferred: the SDK is slow to import
+            client = OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=shared_http_client()
+            )
+            self._clients['OPENAI'] = client
         return client, model, 'OPENAI', 'openai'
     
     def initialize_client(self, provider_name):
@@ -77,77 +398,99 @@ class APIProviderManager:
             else:
                 raise ValueError(f"Unknown provider: {provider_name}")
         except Exception as e:
-            print(f"✗ Failed to initialize {provider_name}: {str(e)}")
+            log.error(f"✗ Failed to initialize {provider_name}: {str(e)}")
             return None, None, None, None
     
     def setup_with_fallback(self):
         """Setup client with fallback logic"""
-        print(f"\nAttempting to connect to primary provider: {self.primary_provider}")
-        self.client, self.model, self.current_provider, self.client_type = self.initialize_client(self.primary_provider)
+        log.info(f"\nAttempting to connect to primary provider: {self.primary_provider}")
+        self._switch_provider(self.initialize_client(self.primary_provider))
         
         if self.client:
-            print(f"✓ Successfully connected to {self.current_provider}")
-            print(f"✓ Using model: {self.model}")
-            print(f"✓ Client type: {self.client_type}")
+            log.info(f"✓ Successfully connected to {self.current_provider}")
+            log.info(f"✓ Using model: {self.model}")
+            log.info(f"✓ Client type: {self.client_type}")
             return True
         
-        # Define fallback chain
-        fallback_providers = []
-        if self.primary_provider == 'NVIDIA':
-            fallback_providers = ['G4F', 'OPENAI']
-        elif self.primary_provider == 'G4F':
-            fallback_providers = ['NVIDIA', 'OPENAI']
-        elif self.primary_provider == 'OPENAI':
-            fallback_providers = ['NVIDIA', 'G4F']
-        
-        for fallback in fallback_providers:
-            print(f"\n⚠ Attempting fallback to {fallback}...")
-            self.client, self.model, self.current_provider, self.client_type = self.initialize_client(fallback)
+        for fallback in FALLBACK_PROVIDERS.get(self.primary_provider, []):
+            log.warning(f"\n⚠ Attempting fallback to {fallback}...")
+            self._switch_provider(self.initialize_client(fallback))
             
             if self.client:
-                print(f"✓ Successfully connected to fallback provider: {self.current_provider}")
-                print(f"✓ Using model: {self.model}")
-                print(f"✓ Client type: {self.client_type}")
+                log.info(f"✓ Successfully connected to fallback provider: {self.current_provider}")
+                log.info(f"✓ Using model: {self.model}")
+                log.info(f"✓ Client type: {self.client_type}")
                 return True
         
-        print("\n✗ All providers failed. Please check your configuration:")
-        print("  • NVIDIA: Verify NVIDIA_API_KEY and NVIDIA_MODEL in .env")
-        print("  • G4F: Ensure g4f library is installed (pip install -U g4f)")
-        print("  • OPENAI: Verify OPENAI_API_KEY in .env")
+        log.error("\n✗ All providers failed. Please check your configuration:")
+        log.info("  • NVIDIA: Verify NVIDIA_API_KEY and NVIDIA_MODEL in .env")
+        log.info("  • G4F: Ensure g4f library is installed (pip install -U g4f)")
+        log.info("  • OPENAI: Verify OPENAI_API_KEY in .env")
         return False
     
-    def chat_completion(self, messages, temperature=0.7, max_tokens=2000, stream=False):
+    def _create_completion(self, messages, temperature, max_tokens, stream, provider=None, response_format=None):
+        """Send one chat completion request with the current client, or the given
+        (client, model, provider_name, client_type) tuple"""
+        client, model, provider_name, client_type = provider or self._active_provider()
+        
+        # Use appropriate client based on type
+        if client_type == 'g4f':
+            # G4F native client
+            return client.chat.completions.create(
+                model=model,
+                messages=messages,
+                # G4F doesn't use temperature/max_tokens the same way
+                stream=stream
+            )
+        elif client_type == 'openai':
+            # OpenAI-compatible client (NVIDIA or OPENAI)
+            request = dict(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=stream
+            )
+            if response_format is None or provider_name in self._no_response_format:
+                return client.chat.completions.create(**request)
+            
+            try:
+                return client.chat.completions.create(response_format=response_format, **request)
+            except Exception as e:
+                if not is_response_format_rejected(e):
+                    raise
+                # Not every model supports structured output; remember per provider and send plain text
+                log.warning(f"⚠ {provider_name} rejected the response format, retrying without it")
+                self._no_response_format.add(provider_name)
+                return client.chat.completions.create(**request)
+        else:
+            raise ValueError(f"Unknown client type: {client_type}")
+    
+    def _create_with_retry(self, messages, temperature, max_tokens, stream, response_format, provider):
+        """Retry transient errors (rate limits, timeouts, 5xx) with jittered exponential backoff"""
+        for attempt in range(CHAT_MAX_ATTEMPTS):
+            try:
+                return self._create_completion(messages, temperature, max_tokens, stream, provider, response_format)
+            except Exception as e:
+                if attempt == CHAT_MAX_ATTEMPTS - 1 or not is_transient_error(e):
+                    raise
+                wait_time = random.uniform(1, min(CHAT_RETRY_MAX_WAIT, 2 ** (attempt + 1)))
+                log.info(f"  Retry {attempt + 1}/{CHAT_MAX_ATTEMPTS - 1} on {provider[2]} "
+                      f"after {wait_time:.1f}s: {type(e).__name__}: {e}")
+                time.sleep(wait_time)
+    
+    def chat_completion(self, messages, temperature=0.7, max_tokens=2000, stream=False, response_format=None):
         """Send a chat completion request using appropriate client"""
-        if not self.client:
+        provider = self._active_provider()
+        if not provider[0]:
             raise Exception("No active client. Please setup client first.")
         
         try:
-            # Use appropriate client based on type
-            if self.client_type == 'g4f':
-                # G4F native client
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    # G4F doesn't use temperature/max_tokens the same way
-                    stream=stream
-                )
-            elif self.client_type == 'openai':
-                # OpenAI-compatible client (NVIDIA or OPENAI)
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    stream=stream
-                )
-            else:
-                raise ValueError(f"Unknown client type: {self.client_type}")
-            
-            return response
+            return self._create_with_retry(messages, temperature, max_tokens, stream, response_format, provider)
             
         except Exception as e:
             error_msg = str(e)
-            print(f"\n✗ Error during API call with {self.current_provider}: {error_msg}")
+            log.error(f"\n✗ Error during API call with {provider[2]}: {error_msg}")
             
             # Try single fallback attempt
             fallback_map = {
@@ -156,333 +499,1018 @@ class APIProviderManager:
                 'OPENAI': 'NVIDIA'
             }
             
-            fallback = fallback_map.get(self.current_provider)
+            fallback = fallback_map.get(provider[2])
             if fallback:
-                print(f"⚠ Attempting fallback to {fallback} due to error...")
+                log.warning(f"⚠ Attempting fallback to {fallback} due to error...")
                 
-                self.client, self.model, self.current_provider, self.client_type = self.initialize_client(fallback)
+                fallback_provider = self.initialize_client(fallback)
                 
-                if self.client:
-                    print(f"✓ Switched to fallback provider: {self.current_provider}")
-                    print(f"✓ Using model: {self.model}")
-                    print(f"✓ Client type: {self.client_type}")
+                if fallback_provider[0]:
+                    # Later requests use the fallback too, unless another thread already switched
+                    if self._switch_provider(fallback_provider, replacing=provider):
+                        log.info(f"✓ Switched to fallback provider: {fallback_provider[2]}")
+                        log.info(f"✓ Using model: {fallback_provider[1]}")
+                        log.info(f"✓ Client type: {fallback_provider[3]}")
                     try:
-                        # Retry with appropriate client
-                        if self.client_type == 'g4f':
-                            response = self.client.chat.completions.create(
-                                model=self.model,
-                                messages=messages,
-                                stream=stream
-                            )
-                        elif self.client_type == 'openai':
-                            response = self.client.chat.completions.create(
-                                model=self.model,
-                                messages=messages,
-                                temperature=temperature,
-                                max_tokens=max_tokens,
-                                stream=stream
-                            )
-                        return response
+                        return self._create_with_retry(
+                            messages, temperature, max_tokens, stream, response_format, fallback_provider
+                        )
                     except Exception as fallback_error:
-                        print(f"✗ Fallback provider also failed: {str(fallback_error)}")
+                        log.error(f"✗ Fallback provider also failed: {str(fallback_error)}")
                         raise
             raise
 
 
+    def hedged_chat_completion(self, messages, temperature=0.7, max_tokens=2000, stream=False, response_format=None):
+        """Send the request to the current and the first available fallback provider
+        at once, keep the first successful response and switch to its provider"""
+        current = self._active_provider()
+        hedge = None
+        for provider_name in FALLBACK_PROVIDERS.get(current[2], []):
+            candidate = self.initialize_client(provider_name)
+            if candidate[0]:
+                hedge = candidate
+                break
+        
+        if not current[0] or hedge is None:
+            return self.chat_completion(messages, temperature, max_tokens, stream, response_format)
+        
+        candidates = [current, hedge]
+        log.info(f"Hedging request across {candidates[0][2]} and {candidates[1][2]}...")
+        
+        executor = ThreadPoolExecutor(max_workers=len(candidates))
+        futures = {
+            executor.submit(
+                self._create_completion, messages, temperature, max_tokens, stream, candidate, response_format
+            ): candidate
+            for candidate in candidates
+        }
+        
+        try:
+            pending = set(futures)
+            last_error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        last_error = future.exception()
+                        log.error(f"✗ Hedged request to {futures[future][2]} failed: {str(last_error)}")
+                        continue
+                    
+                    # Keep the winner for later steps; release the losing responses
+                    self._switch_provider(futures[future], replacing=current)
+                    log.info(f"✓ {futures[future][2]} answered first")
+                    for loser in pending:
+                        loser.cancel()
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+            
+            raise last_error
+        finally:
+            executor.shutdown(wait=False)
+
+
+def _close_response(future):
+    """Close a streamed response that lost a hedged request"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), 'close', None)
+    if close:
+        close()
 
-def load_existing_ideas(filename='ideas.json'):
-    """Load existing ideas from JSON file if it exists"""
+
+def is_response_format_rejected(error):
+    """Check whether an API error means the provider doesn't accept a response_format
     
-    print("\n" + "="*60)
-    print("CHECKING FOR EXISTING IDEAS")
-    print("="*60 + "\n")
+    Providers answer with a 400, 404 or 422 that names the parameter; other errors
+    with those codes (context length, unknown model) say nothing about structured output.
+    """
+    import openai
+    if not isinstance(error, openai.APIStatusError):
+        return False
+    details = f"{error} {getattr(error, 'body', '') or ''}".lower()
+    return 'response_format' in details or 'json_schema' in details
+
+
+def is_transient_error(error):
+    """Check whether an API error is worth retrying on the same provider"""
+    import openai
+    return isinstance(error, (
+        openai.RateLimitError,
+        openai.APIConnectionError,  # Includes APITimeoutError
+        openai.InternalServerError,
+    ))
+
+
+
+class StreamingArrayParser:
+    """Incrementally decode the objects of the first JSON array in streamed text
     
-    if not os.path.exists(filename):
-        print(f"✓ No existing file found: {filename}")
-        print("  Starting with empty list (IDs will start from 1)")
-        return [], 0
+    Decoded items are dropped from the buffer, so only the item still being
+    streamed is held in memory. Text before the array starts is kept in case
+    the response has to be parsed as a whole instead.
+    """
     
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            existing_ideas = json.load(f)
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = None  # Index inside the array, None until '[' is seen
+        self.closed = False
+        self.failed = False
+    
+    def feed(self, text):
+        """Add streamed text and return the array items it completed"""
+        self.buffer += text
+        items = []
         
-        # Ensure it's a list
-        if not isinstance(existing_ideas, list):
-            print(f"⚠ Warning: Existing file is not a JSON array. Starting fresh.")
-            return [], 0
+        if self.closed or self.failed:
+            return items
         
-        if len(existing_ideas) == 0:
-            print(f"✓ Found empty file: {filename}")
-            print("  Starting with empty list (IDs will start from 1)")
-            return [], 0
+        if self.pos is None:
+            start = self.buffer.find('[')
+            if start == -1:
+                return items
+            self.pos = start + 1
+        elif '}' not in text and ']' not in text:
+            # Nothing can have closed since the last attempt
+            return items
         
-        # Find the maximum ID
-        max_id = max(idea.get('id', 0) for idea in existing_ideas)
+        pos = self.pos
+        while True:
+            # Skip separators between items
+            while pos < len(self.buffer) and self.buffer[pos] in ' \t\r\n,':
+                pos += 1
+            
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == ']':
+                self.closed = True
+                break
+            
+            try:
+                item, pos = self.decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                # The next item hasn't fully arrived yet
+                break
+            
+            if not isinstance(item, dict):
+                # Not an array of ideas, leave it to a full parse
+                self.failed = True
+                break
+            items.append(item)
         
-        print(f"✓ Found {len(existing_ideas)} existing ideas in {filename}")
-        print(f"  Highest existing ID: {max_id}")
-        print(f"  New ideas will start from ID: {max_id + 1}")
+        if items:
+            # Drop the decoded items from the buffer
+            self.buffer = self.buffer[pos:]
+            pos = 0
+        self.pos = pos
         
-        return existing_ideas, max_id
+        return items
+
+
+def iter_stream_text(response):
+    """Yield the text deltas of a streamed chat completion"""
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
+
+
+def normalize_idea_list(json_data):
+    """Return the list of ideas from a parsed response, unwrapping an object if needed"""
+    # Extract array if wrapped in object
+    if isinstance(json_data, dict):
+        log.info(f"Response is a dictionary with keys: {list(json_data.keys())}")
+        for key, value in json_data.items():
+            if isinstance(value, list) and len(value) > 0:
+                log.info(f"✓ Found array in key '{key}', extracting it...")
+                return value
+        log.info("No array found, wrapping single object in array...")
+        return [json_data]
+    elif isinstance(json_data, list):
+        log.info(f"✓ Response is already an array with {len(json_data)} items")
+        return json_data
+    return [json_data]
+
+
+def _print_preview(label, preview):
+    """Print the head of an API response"""
+    log.info("\n" + "-"*60)
+    log.info(f"{label}:")
+    log.info("-"*60)
+    log.info(preview)
+    log.info("-"*60 + "\n")
+
+
+def read_streamed_ideas(response, label=None, on_item=None):
+    """Decode the ideas of a streamed JSON response as each object closes
+    
+    Args:
+        response: Streamed chat completion
+        label: Title for the printed response preview, or None to skip it
+        on_item: Optional callback for each idea as it arrives
+    
+    Returns:
+        list: The ideas in the response
+    """
+    parser = StreamingArrayParser()
+    head = io.StringIO()
+    ideas = []
+    
+    for text in iter_stream_text(response):
+        # Keep only the head of the response for the preview, and show it
+        # as soon as it is complete instead of after the whole response
+        if head.tell() < PREVIEW_CHARS:
+            head.write(text[:PREVIEW_CHARS - head.tell()])
+            if label and head.tell() == PREVIEW_CHARS:
+                _print_preview(label, head.getvalue() + "...")
         
+        for item in parser.feed(text):
+            ideas.append(item)
+            if on_item:
+                on_item(item)
+    
+    if label and head.tell() < PREVIEW_CHARS:
+        _print_preview(label, head.getvalue())
+    
+    if ideas:
+        if parser.closed:
+            log.info(f"✓ Successfully parsed {len(ideas)} ideas from the stream")
+        else:
+            log.warning(f"⚠ Response ended before the array closed, keeping {len(ideas)} complete ideas")
+        return ideas
+    
+    # No array of objects in the stream, so nothing was dropped from the buffer
+    log.info("Parsing JSON response...")
+    try:
+        json_data = json.loads(parser.buffer)
+        log.info("✓ Successfully parsed JSON")
     except json.JSONDecodeError as e:
-        print(f"⚠ Warning: Could not parse existing JSON file: {str(e)}")
-        print("  Starting fresh with empty list")
-        return [], 0
-    except Exception as e:
-        print(f"⚠ Warning: Error reading file: {str(e)}")
-        print("  Starting fresh with empty list")
-        return [], 0
+        log.error(f"✗ JSON parsing failed: {str(e)}")
+        raise ValueError(f"Could not parse JSON response: {str(e)}")
+    
+    return normalize_idea_list(json_data)
 
 
 
-def generate_initial_ideas(manager):
-    """Generate initial video content ideas"""
+def read_json_file(path):
+    """Load a JSON file, using orjson when it is installed"""
+    if orjson:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# filename -> ((mtime_ns, size), ideas): the last parse of each ideas file
+_ideas_snapshots = {}
+
+
+def read_ideas_file(filename):
+    """Parse an ideas file, reusing the previous parse while the file is unchanged
+    
+    The generate flow needs the existing ideas up to three times (counting them,
+    embedding them for the duplicate check, rewriting the file); this parses once.
+    Callers must not modify the returned list.
+    """
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    snapshot = _ideas_snapshots.get(filename)
+    if snapshot and snapshot[0] == stamp:
+        return snapshot[1]
     
-    prompt = """Create a JSON array with 5–10 short-form video content ideas optimized for TikTok, Instagram Reels, and YouTube Shorts, suitable for a general knowledge or storytelling channel.
+    ideas = read_json_file(filename)
+    _ideas_snapshots[filename] = (stamp, ideas)
+    return ideas
 
 
-Requirements:
-- Ensure diversity across science, history, unsolved mysteries, technology, surprising human-interest stories, and oddities. Cover at least 5 different categories overall.
-- Each idea must be anchored in a specific interesting fact, lesser-known story, or fascinating concept that can be explained in 20–45 seconds.
-- idea: Write a strong hook-style title (4–8 words), no clickbait, clear capitalization, minimal punctuation.
-- caption: One compelling sentence that teases the twist or key takeaway and sets a hook-first narrative.
-- channel_style_prompt: Concise, comma-separated keywords for theme and editing style suited to vertical short-form content, e.g., vertical video, fast paced, b roll, text captions, sound effects, dramatic reveal, educational, voiceover.
-- character_style_prompt: A vivid, visual prompt for a key image or character tied to the idea (include age, attire, setting, lighting, mood, camera angle, color palette).
-- production_status: Always set to for production.
-- final_output: Leave blank (empty string).
-- publishing_status: Always set to pending.
-- error_log: Leave blank (empty string).
-- Language: English.
-- Safety: Avoid sensationalism and harmful content; keep facts accurate. If speculative, use words like theory or legend in the caption.
-- IMPORTANT: Output ONLY valid JSON with proper double quotes around all keys and string values.
-- Do not add any commentary before or after the JSON.
+def loads_json(data):
+    """Parse JSON from bytes or str, using orjson when it is installed"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
-Output format: A JSON array of objects with these exact fields:
-id, idea, caption, channel_style_prompt, character_style_prompt, production_status, final_output, publishing_status, error_log
+def compact_json(data):
+    """Serialize data as JSON without whitespace, for use inside prompts"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
 
 
-Constraints:
-- id is a unique integer starting at 1.
-- Do not repeat the same subtopic; ensure variety across entries.
-- Optimize all ideas for vertical short-form pacing with a 3–5 second hook.
-- Output valid JSON only with properly escaped quotes if needed."""
+def dump_json_bytes(data):
+    """Serialize data as indented UTF-8 JSON, using orjson when it is installed"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _fsync_directory(path):
+    """Flush a directory entry change (such as a rename) to disk where supported"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Directories can't be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_file(path, data, durable=True):
+    """Write data as indented UTF-8 JSON atomically
     
-    messages = [
-        {"role": "user", "content": prompt}
-    ]
+    The data goes to a temporary file that is synced and then renamed over
+    path, so a crash mid-write leaves the previous file intact. The temporary
+    name is unique to the writing thread, so concurrent writers (main.py's
+    stages, story.py run on its own) can't interleave their bytes in it.
+    With durable=False the syncs are skipped, for caches that can be rebuilt.
+    """
+    data_bytes = dump_json_bytes(data)  # Serialized before the file is touched
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data_bytes)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable:
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+class _FlockLock:
+    """Minimal exclusive lock on a file with fcntl.flock, used when filelock isn't installed"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
     
-    print("\n" + "="*60)
-    print("STEP 1: GENERATING INITIAL VIDEO IDEAS")
-    print("="*60)
-    print(f"Using Provider: {manager.current_provider}")
-    print(f"Using Model: {manager.model}")
-    print(f"Client Type: {manager.client_type}")
-    print("="*60 + "\n")
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
     
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def ideas_file_lock(path):
+    """The cross-process lock every writer of an ideas file takes, or None if neither backend is available"""
+    if FileLock:
+        return FileLock(path + ".lock")
+    if fcntl:
+        return _FlockLock(path + ".lock")
+    return None
+
+
+def journal_path_for(path):
+    """The status journal kept next to an ideas file (ideas.json -> ideas.journal)"""
+    return os.path.splitext(path)[0] + ".journal"
+
+
+def append_journal_entry(journal_path, idea_id, fields):
+    """Durably record an idea update: one JSON line, flushed and fsynced"""
+    with open(journal_path, 'ab') as f:
+        f.write(compact_json({"id": idea_id, **fields}).encode('utf-8') + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def replay_journal(journal_path, ideas_by_id):
+    """Apply a journal's updates to the ideas they name, returning how many entries it held"""
+    entries = 0
     try:
-        print("Sending request to API...")
-        response = manager.chat_completion(
-            messages, 
-            temperature=0.8, 
-            max_tokens=2500
-        )
-        
-        raw_content = response.choices[0].message.content
-        
-        print("\n" + "-"*60)
-        print("RAW API RESPONSE:")
-        print("-"*60)
-        print(raw_content[:500] + "..." if len(raw_content) > 500 else raw_content)
-        print("-"*60 + "\n")
-        
-        # Parse JSON
-        print("Parsing JSON response...")
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = loads_json(line)
+                except ValueError:
+                    # A line cut short by a crash mid-write; everything before it is intact
+                    log.warning(f"⚠️  Skipping a damaged line in {journal_path}")
+                    continue
+                idea = ideas_by_id.get(entry.pop('id', None))
+                if idea is not None:
+                    idea.update(entry)
+                entries += 1
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def append_ideas_to_file(new_ideas, path):
+    """Append ideas to the JSON array in path without serializing the existing ones again
+    
+    The appended text is laid out exactly as a full indented dump would be. The
+    file is copied byte for byte to a temporary file, the new closing bracket is
+    written there and it is renamed over path, so a crash mid-write leaves the
+    previous file intact. Returns False if the file doesn't end in an array of
+    objects, in which case it has to be rewritten in full.
+    """
+    if not new_ideas:
+        return True
+    
+    # Keep only the indented items between the outer brackets
+    body = dump_json_bytes(new_ideas)
+    body = body[body.index(b'[') + 1:body.rindex(b']')].strip(b'\n')
+    
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        tail_start = max(0, size - 64)
+        f.seek(tail_start)
+        tail = f.read().rstrip()
+    
+    if not tail.endswith(b']'):
+        return False
+    last_item = tail[:-1].rstrip()
+    if not last_item.endswith(b'}'):
+        return False
+    
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(path, tmp_path)  # Kernel-side copy where the platform has one
+        with open(tmp_path, 'r+b') as f:
+            # Overwrite from just after the last object's closing brace
+            f.seek(tail_start + len(last_item))
+            f.write(b',\n' + body + b'\n]')
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
         try:
-            json_data = json.loads(raw_content)
-            print("✓ Successfully parsed JSON")
-        except json.JSONDecodeError as e:
-            print(f"✗ JSON parsing failed: {str(e)}")
-            raise ValueError(f"Could not parse JSON response: {str(e)}")
-        
-        # Extract array if wrapped in object
-        if isinstance(json_data, dict):
-            print(f"Response is a dictionary with keys: {list(json_data.keys())}")
-            for key, value in json_data.items():
-                if isinstance(value, list) and len(value) > 0:
-                    print(f"✓ Found array in key '{key}', extracting it...")
-                    json_data = value
-                    break
-            else:
-                print("No array found, wrapping single object in array...")
-                json_data = [json_data]
-        elif isinstance(json_data, list):
-            print(f"✓ Response is already an array with {len(json_data)} items")
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(os.path.dirname(os.path.abspath(path)))
+    
+    return True
+
+
+
+def scan_ideas_file(filename):
+    """Count the ideas in a JSON array file and find the highest ID in one streaming pass"""
+    parser = StreamingArrayParser()
+    idea_count = 0
+    max_id = 0
+    
+    with open(filename, 'r', encoding='utf-8') as f:
+        while True:
+            text = f.read(SCAN_CHUNK_CHARS)
+            if not text:
+                break
+            if parser.pos is None and text.strip() and not text.lstrip().startswith('['):
+                raise ValueError("Existing file is not a JSON array")
+            
+            for idea in parser.feed(text):
+                idea_count += 1
+                max_id = max(max_id, idea.get('id', 0))
+    
+    if not parser.closed or parser.failed:
+        raise ValueError("Existing file is not a complete JSON array of ideas")
+    
+    return idea_count, max_id
+
+
+def load_existing_ideas(filename='ideas.json'):
+    """Count the existing ideas in the JSON file and find the highest ID
+    
+    Returns:
+        tuple: (number of existing ideas, highest existing ID)
+    """
+    
+    log.info("\n" + "="*60)
+    log.info("\nCHECKING FOR EXISTING IDEAS")
+    log.info("="*60 + "\n")
+    
+    # One stat answers both whether the file exists and how to read it
+    try:
+        file_size = os.path.getsize(filename)
+    except FileNotFoundError:
+        log.info(f"✓ No existing file found: {filename}")
+        log.info("  Starting with empty list (IDs will start from 1)")
+        return 0, 0
+    
+    try:
+        if file_size > LARGE_IDEAS_FILE_BYTES:
+            # Stream large files so only one idea is decoded at a time
+            idea_count, max_id = scan_ideas_file(filename)
         else:
-            json_data = [json_data]
+            existing_ideas = read_ideas_file(filename)
+            
+            # Ensure it's a list
+            if not isinstance(existing_ideas, list):
+                log.warning(f"⚠ Warning: Existing file is not a JSON array. Starting fresh.")
+                return 0, 0
+            
+            idea_count = len(existing_ideas)
+            max_id = max((idea.get('id', 0) for idea in existing_ideas), default=0)
         
-        print(f"\n✓ Generated {len(json_data)} initial ideas")
-        for item in json_data:
-            idea_id = item.get('id', 'N/A')
-            idea_title = item.get('idea', 'N/A')
-            print(f"  • ID {idea_id}: {idea_title}")
+        if idea_count == 0:
+            log.info(f"✓ Found empty file: {filename}")
+            log.info("  Starting with empty list (IDs will start from 1)")
+            return 0, 0
         
-        return json_data
+        log.info(f"✓ Found {idea_count} existing ideas in {filename}")
+        log.info(f"  Highest existing ID: {max_id}")
+        log.info(f"  New ideas will start from ID: {max_id + 1}")
         
+        return idea_count, max_id
+        
+    except json.JSONDecodeError as e:
+        log.warning(f"⚠ Warning: Could not parse existing JSON file: {str(e)}")
+        log.info("  Starting fresh with empty list")
+        return 0, 0
     except Exception as e:
-        print(f"\n✗ Error generating initial ideas: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
+        log.warning(f"⚠ Warning: Error reading file: {str(e)}")
+        log.info("  Starting fresh with empty list")
+        return 0, 0
 
 
 
-def rank_and_filter_ideas(manager, initial_ideas):
-    """Rank ideas and return only the best ones"""
+def generate_category_ideas(manager, category):
+    """Generate a few ideas scoped to a single category"""
+    messages = [
+        {"role": "system", "content": IDEA_GENERATION_PROMPT},
+        {"role": "user", "content": CATEGORY_REQUEST_TEMPLATE.format_map({
+            'count': IDEAS_PER_CATEGORY, 'category': category
+        })}
+    ]
+    response = manager.chat_completion(
+        messages, temperature=0.8, max_tokens=1000, stream=True,
+        response_format=IDEAS_RESPONSE_FORMAT
+    )
+    return read_streamed_ideas(response)
+
+
+def generate_ideas_in_parallel(manager):
+    """Generate ideas with one concurrent request per category, then merge and dedupe them"""
+    categories = [IDEA_CATEGORIES[n % len(IDEA_CATEGORIES)] for n in range(PARALLEL_IDEA_CALLS)]
+    log.info(f"Sending {len(categories)} category requests in parallel...")
+    
+    def generate(category):
+        try:
+            return generate_category_ideas(manager, category)
+        except Exception as e:
+            log.error(f"✗ Request for {category} ideas failed: {str(e)}")
+            return []
+    
+    with ThreadPoolExecutor(max_workers=len(categories)) as executor:
+        results = list(executor.map(generate, categories))
+    
+    # Drop repeated titles and number the merged ideas from 1
+    merged = []
+    seen_titles = set()
+    for category, category_ideas in zip(categories, results):
+        log.info(f"  ✓ {category}: {len(category_ideas)} ideas")
+        for idea in category_ideas:
+            title = re.sub(r"\W+", " ", str(idea.get('idea', ''))).strip().lower()
+            if title in seen_titles:
+                continue
+            seen_titles.add(title)
+            idea['id'] = len(merged) + 1
+            merged.append(idea)
     
-    # Convert ideas to JSON string for inclusion in prompt
-    ideas_json_string = json.dumps(initial_ideas, indent=2, ensure_ascii=False)
+    if not merged:
+        raise ValueError("All category requests failed")
     
-    ranking_prompt = f"""Analyze and rank all provided short-form video ideas based on the following criteria. Output ONLY the top-ranked ideas in JSON format matching the original input structure.
+    return merged
 
 
-Evaluation Criteria (Score each 1-10):
+def checkpoint_path(step, *key_parts):
+    """Checkpoint file for a step, keyed by a hash of everything its output depends on"""
+    digest = hashlib.sha256('\0'.join(str(part) for part in key_parts).encode('utf-8')).hexdigest()
+    return os.path.join(CHECKPOINT_DIR, f"{step}-{digest[:16]}.json")
 
 
-1. hook_strength: Does the title and caption immediately grab attention within 3 seconds? Is the hook curiosity-driven and specific?
+def load_checkpoint(path):
+    """Return a step's checkpointed output, or None if it's missing or older than the TTL"""
+    try:
+        if time.time() - os.path.getmtime(path) > CHECKPOINT_TTL:
+            return None
+        return read_json_file(path)
+    except (OSError, ValueError):
+        return None
 
 
-2. viral_potential: Likelihood of shares, saves, and rewatches based on uniqueness, emotional trigger, or surprise factor.
+def save_checkpoint(path, data):
+    """Checkpoint a step's output; failures only cost the ability to resume"""
+    try:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        write_json_file(path, data)
+    except OSError as e:
+        log.warning(f"⚠ Couldn't write checkpoint '{path}': {e}")
 
 
-3. production_feasibility: Can this be produced with accessible resources? Does the character_style_prompt provide clear visual direction?
+def clear_checkpoints():
+    """Remove step checkpoints once their ideas are saved, so the next run starts fresh"""
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return
+    for name in os.listdir(CHECKPOINT_DIR):
+        if name.startswith(('initial-', 'ranked-', 'combined-')) and name.endswith('.json'):
+            try:
+                os.remove(os.path.join(CHECKPOINT_DIR, name))
+            except OSError:
+                pass
 
 
-4. educational_value: Does it deliver a satisfying payoff? Is the fact or story genuinely interesting and memorable?
+def generate_initial_ideas(manager):
+    """Generate initial video content ideas"""
+    
+    checkpoint = checkpoint_path(
+        'initial', IDEA_GENERATION_PROMPT, IDEA_GENERATION_REQUEST, CATEGORY_REQUEST_TEMPLATE,
+        PARALLEL_IDEA_CALLS, manager.current_provider, manager.model
+    )
+    cached = load_checkpoint(checkpoint)
+    if cached:
+        log.info(f"\n✓ Resuming with {len(cached)} initial ideas from checkpoint '{checkpoint}'")
+        return cached
+    
+    messages = [
+        {"role": "system", "content": IDEA_GENERATION_PROMPT},
+        {"role": "user", "content": IDEA_GENERATION_REQUEST}
+    ]
+    
+    log.info("\n" + "="*60)
+    log.info("\nSTEP 1: GENERATING INITIAL VIDEO IDEAS")
+    log.info("="*60)
+    log.info(f"Using Provider: {manager.current_provider}")
+    log.info(f"Using Model: {manager.model}")
+    log.info(f"Client Type: {manager.client_type}")
+    log.info("="*60 + "\n")
+    
+    try:
+        if PARALLEL_IDEA_CALLS > 1:
+            json_data = generate_ideas_in_parallel(manager)
+        else:
+            log.info("Sending request to API...")
+            send = manager.hedged_chat_completion if HEDGE_REQUESTS else manager.chat_completion
+            response = send(
+                messages, 
+                temperature=0.8, 
+                max_tokens=2500,
+                stream=True,
+                response_format=IDEAS_RESPONSE_FORMAT
+            )
+            
+            # Decode each idea as soon as its object closes in the stream
+            json_data = read_streamed_ideas(
+                response, "RAW API RESPONSE",
+                on_item=lambda item: log.info(f"  ✓ Received idea: {item.get('idea', 'N/A')}")
+            )
+        
+        log.info(f"\n✓ Generated {len(json_data)} initial ideas")
+        for item in json_data:
+            idea_id = item.get('id', 'N/A')
+            idea_title = item.get('idea', 'N/A')
+            log.info(f"  • ID {idea_id}: {idea_title}")
+        
+        save_checkpoint(checkpoint, json_data)
+        return json_data
+        
+    except Exception as e:
+        log.error(f"\n✗ Error generating initial ideas: {type(e).__name__}: {e}")
+        # The stack is only formatted when DEBUG is set, which enables this level
+        log.debug("Idea generation failed at:", exc_info=True)
+        return None
 
 
-5. platform_optimization: Is it optimized for vertical video pacing (20-45 seconds)? Does the channel_style_prompt match short-form best practices?
+
+def generate_and_rank_ideas(manager):
+    """Generate ideas and keep only the top-ranked ones with a single request
+    
+    Returns:
+        list: The selected ideas, best first, or None if the request failed
+    """
+    checkpoint = checkpoint_path(
+        'combined', GENERATE_AND_RANK_PROMPT, IDEA_GENERATION_REQUEST,
+        manager.current_provider, manager.model
+    )
+    cached = load_checkpoint(checkpoint)
+    if cached:
+        log.info(f"\n✓ Resuming with {len(cached)} ranked ideas from checkpoint '{checkpoint}'")
+        return cached
+    
+    messages = [
+        {"role": "system", "content": GENERATE_AND_RANK_PROMPT},
+        {"role": "user", "content": IDEA_GENERATION_REQUEST}
+    ]
+    
+    log.info("\n" + "="*60)
+    log.info("\nSTEP 1: GENERATING AND RANKING VIDEO IDEAS")
+    log.info("="*60)
+    log.info(f"Using Provider: {manager.current_provider}")
+    log.info(f"Using Model: {manager.model}")
+    log.info(f"Client Type: {manager.client_type}")
+    log.info("="*60 + "\n")
+    
+    try:
+        log.info("Sending request to API...")
+        send = manager.hedged_chat_completion if HEDGE_REQUESTS else manager.chat_completion
+        response = send(
+            messages,
+            temperature=0.7,
+            max_tokens=2500,
+            stream=True,
+            response_format=IDEAS_RESPONSE_FORMAT
+        )
+        json_data = read_streamed_ideas(response, "RAW API RESPONSE")
+        
+        log.info(f"\n✓ Kept {len(json_data)} top-ranked ideas")
+        for idx, item in enumerate(json_data, 1):
+            log.info(f"  #{idx} - ID {item.get('id', 'N/A')}: {item.get('idea', 'N/A')}")
+        
+        save_checkpoint(checkpoint, json_data)
+        return json_data
+        
+    except Exception as e:
+        log.error(f"\n✗ Error generating and ranking ideas: {type(e).__name__}: {e}")
+        # The stack is only formatted when DEBUG is set, which enables this level
+        log.debug("Combined idea request failed at:", exc_info=True)
+        return None
 
 
-6. engagement_trigger: Does it spark comments, debates, or emotional reactions (wonder, curiosity, shock)?
 
+def limit_compute_threads():
+    """Size the BLAS and tokenizer thread pools before they start, so they don't fight for cores
+    
+    Only takes effect when called before numpy or torch is imported; explicit
+    settings in the environment win.
+    """
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    os.environ.setdefault('OMP_NUM_THREADS', str(EMBEDDING_THREADS))
 
-Ranking Process:
-- Calculate total_score for each idea (sum of all 6 criteria, max 60 points)
-- Rank all ideas from highest to lowest total_score
-- For ties, prioritize hook_strength, then viral_potential
-- Select only ideas with total_score >= 45 (top-tier ideas)
-- If fewer than 3 ideas score >= 45, output the top 3 ideas regardless of score
 
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """Load the sentence-transformers model once, or None if it isn't installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    
+    import torch  # Installed with sentence-transformers
+    torch.set_num_threads(int(os.environ.get('OMP_NUM_THREADS', EMBEDDING_THREADS)))
+    return SentenceTransformer(EMBEDDING_MODEL)
 
-Output Format (JSON array):
-[
-  {{
-    "id": 1,
-    "idea": "<original_idea_title>",
-    "caption": "<original_caption>",
-    "channel_style_prompt": "<original_channel_style_prompt>",
-    "character_style_prompt": "<original_character_style_prompt>",
-    "production_status": "for production",
-    "final_output": "",
-    "publishing_status": "pending",
-    "error_log": ""
-  }}
-]
 
+def embed_texts(texts):
+    """Embed texts as L2-normalized rows of a float32 matrix
+    
+    Uses the sentence-transformers model when available, otherwise a hashed
+    bag of words, which still captures shared vocabulary between ideas.
+    """
+    import numpy as np  # Deferred: only the local ranker needs it
+    
+    model = get_embedding_model()
+    if model is not None:
+        return np.asarray(model.encode(texts, batch_size=32, normalize_embeddings=True), dtype=np.float32)
+    
+    vectors = np.zeros((len(texts), HASHED_EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in re.findall(r"[a-z0-9']+", text.lower()):
+            vectors[row, zlib.crc32(token.encode('utf-8')) % HASHED_EMBEDDING_DIM] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
 
-Requirements:
-- Output ONLY valid JSON array with no additional text, markdown, or commentary
-- Preserve all original field values exactly as provided in the input
-- Order array from highest ranked to lowest ranked
-- Include only top-performing ideas based on scoring threshold
-- Ensure JSON is parseable by Python json.loads()
 
+def idea_text(idea):
+    """Text used to compare ideas: the title and its caption"""
+    return f"{idea.get('idea', '')}. {idea.get('caption', '')}"
 
-Here are the ideas to rank:
+
+def score_ideas_locally(initial_ideas):
+    """Score ideas from 0-30 on hook strength, completeness and novelty"""
+    import numpy as np
+    
+    embeddings = embed_texts([idea_text(idea) for idea in initial_ideas])
+    
+    # Novelty: distance from the centroid of the batch, so near-repeats score low
+    centroid = embeddings.mean(axis=0)
+    centroid /= max(np.linalg.norm(centroid), 1e-9)
+    novelty = 1.0 - embeddings @ centroid
+    novelty_range = novelty.max() - novelty.min()
+    novelty_scores = 10 * (novelty - novelty.min()) / novelty_range if novelty_range > 0 else np.full(len(novelty), 5.0)
+    
+    scores = []
+    for idea, novelty_score in zip(initial_ideas, novelty_scores):
+        title = idea.get('idea', '')
+        caption = idea.get('caption', '')
+        
+        # Hook strength: a 4-8 word title with curiosity words, numbers or a question
+        hook = 4 if 4 <= len(title.split()) <= 8 else 1
+        hook += min(3, len(HOOK_WORDS.findall(f"{title} {caption}")))
+        hook += 2 if re.search(r"\d", title) else 0
+        hook += 1 if caption.rstrip().endswith('?') else 0
+        
+        # Completeness: the prompts production needs are present and descriptive
+        completeness = sum(2 for key in ('idea', 'caption', 'channel_style_prompt') if idea.get(key))
+        completeness += min(4, len(idea.get('character_style_prompt', '').split()) // 10)
+        
+        scores.append(min(hook, 10) + min(completeness, 10) + float(novelty_score))
+    
+    return scores
 
 
-{ideas_json_string}"""
+def rank_ideas_locally(initial_ideas):
+    """Rank ideas with local heuristics and keep the best ones, without an API call"""
+    log.info("\n" + "="*60)
+    log.info("\nSTEP 2: RANKING AND FILTERING IDEAS (LOCAL)")
+    log.info("="*60)
+    log.info(f"Analyzing {len(initial_ideas)} ideas...")
+    log.info("="*60 + "\n")
+    
+    scores = score_ideas_locally(initial_ideas)
+    ranked = sorted(zip(scores, initial_ideas), key=lambda pair: pair[0], reverse=True)
     
+    # Same selection rule as the LLM ranker: top tier (>= 75%), at least 3 ideas
+    selected = [idea for score, idea in ranked if score >= 22.5]
+    if len(selected) < 3:
+        selected = [idea for _, idea in ranked[:3]]
+    
+    log.info(f"✓ Filtered to {len(selected)} top-ranked ideas")
+    for idx, (score, item) in enumerate(ranked[:len(selected)], 1):
+        log.info(f"  #{idx} - ID {item.get('id', 'N/A')}: {item.get('idea', 'N/A')} (score {score:.1f}/30)")
+    
+    return selected
+
+
+def rank_idea_batch(manager, ideas, label=None):
+    """Ask the model to rank a batch of ideas and return the top-ranked ones"""
+    # Only the ideas vary between calls; the instructions go in the static system prompt.
+    # The model doesn't need indentation, so send compact JSON to save input tokens
     messages = [
-        {"role": "user", "content": ranking_prompt}
+        {"role": "system", "content": RANKING_PROMPT},
+        {"role": "user", "content": RANKING_REQUEST_TEMPLATE.format_map({'ideas_json': compact_json(ideas)})}
     ]
+    response = manager.chat_completion(
+        messages, 
+        temperature=0.3,  # Lower temperature for more consistent evaluation
+        max_tokens=2500,
+        stream=True,
+        response_format=IDEAS_RESPONSE_FORMAT
+    )
+    return read_streamed_ideas(response, label)
+
+
+def rank_and_filter_ideas(manager, initial_ideas):
+    """Rank ideas and return only the best ones"""
+    
+    checkpoint = checkpoint_path(
+        'ranked', IDEA_RANKER, RANKING_PROMPT, RANKING_BATCH_SIZE, compact_json(initial_ideas),
+        manager.current_provider, manager.model
+    )
+    cached = load_checkpoint(checkpoint)
+    if cached:
+        log.info(f"\n✓ Resuming with {len(cached)} ranked ideas from checkpoint '{checkpoint}'")
+        return cached
+    
+    if IDEA_RANKER == 'local':
+        ranked = rank_ideas_locally(initial_ideas)
+        save_checkpoint(checkpoint, ranked)
+        return ranked
     
-    print("\n" + "="*60)
-    print("STEP 2: RANKING AND FILTERING IDEAS")
-    print("="*60)
-    print(f"Using Provider: {manager.current_provider}")
-    print(f"Using Model: {manager.model}")
-    print(f"Client Type: {manager.client_type}")
-    print(f"Analyzing {len(initial_ideas)} ideas...")
-    print("="*60 + "\n")
+    batch_size = RANKING_BATCH_SIZE if RANKING_BATCH_SIZE > 0 else len(initial_ideas)
+    batches = [initial_ideas[start:start + batch_size] for start in range(0, len(initial_ideas), batch_size)]
+    
+    log.info("\n" + "="*60)
+    log.info("\nSTEP 2: RANKING AND FILTERING IDEAS")
+    log.info("="*60)
+    log.info(f"Using Provider: {manager.current_provider}")
+    log.info(f"Using Model: {manager.model}")
+    log.info(f"Client Type: {manager.client_type}")
+    log.info(f"Analyzing {len(initial_ideas)} ideas...")
+    log.info("="*60 + "\n")
     
     try:
-        print("Sending ranking request to API...")
-        response = manager.chat_completion(
-            messages, 
-            temperature=0.3,  # Lower temperature for more consistent evaluation
-            max_tokens=2500
-        )
-        
-        raw_content = response.choices[0].message.content
-        
-        print("\n" + "-"*60)
-        print("RANKING API RESPONSE:")
-        print("-"*60)
-        print(raw_content[:500] + "..." if len(raw_content) > 500 else raw_content)
-        print("-"*60 + "\n")
-        
-        # Parse JSON
-        print("Parsing ranked ideas JSON...")
-        try:
-            json_data = json.loads(raw_content)
-            print("✓ Successfully parsed ranked ideas")
-        except json.JSONDecodeError as e:
-            print(f"✗ JSON parsing failed: {str(e)}")
-            raise ValueError(f"Could not parse ranked ideas JSON: {str(e)}")
-        
-        # Extract array if wrapped in object
-        if isinstance(json_data, dict):
-            print(f"Response is a dictionary with keys: {list(json_data.keys())}")
-            for key, value in json_data.items():
-                if isinstance(value, list) and len(value) > 0:
-                    print(f"✓ Found array in key '{key}', extracting it...")
-                    json_data = value
-                    break
-            else:
-                print("No array found, wrapping single object in array...")
-                json_data = [json_data]
-        elif isinstance(json_data, list):
-            print(f"✓ Response is already an array with {len(json_data)} items")
+        if len(batches) == 1:
+            log.info("Sending ranking request to API...")
+            json_data = rank_idea_batch(manager, initial_ideas, "RANKING API RESPONSE")
         else:
-            json_data = [json_data]
+            # Each batch keeps its own top tier; the survivors are concatenated in batch order
+            log.info(f"Sending {len(batches)} ranking requests in parallel...")
+            with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+                results = list(executor.map(lambda batch: rank_idea_batch(manager, batch), batches))
+            json_data = [idea for batch_ideas in results for idea in batch_ideas]
         
-        print(f"\n✓ Filtered to {len(json_data)} top-ranked ideas")
+        log.info(f"\n✓ Filtered to {len(json_data)} top-ranked ideas")
         for idx, item in enumerate(json_data, 1):
             idea_id = item.get('id', 'N/A')
             idea_title = item.get('idea', 'N/A')
-            print(f"  #{idx} - ID {idea_id}: {idea_title}")
+            log.info(f"  #{idx} - ID {idea_id}: {idea_title}")
         
+        save_checkpoint(checkpoint, json_data)
         return json_data
         
     except Exception as e:
-        print(f"\n✗ Error ranking ideas: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error(f"\n✗ Error ranking ideas: {type(e).__name__}: {e}")
+        # The stack is only formatted when DEBUG is set, which enables this level
+        log.debug("Ranking failed at:", exc_info=True)
         return None
 
 
 
+def embeddings_sidecar_path(ideas_file):
+    """Path of the .npy file caching the embeddings of the ideas in ideas_file"""
+    return os.path.splitext(ideas_file)[0] + EMBEDDINGS_SIDECAR_SUFFIX
+
+
+def load_idea_embeddings(ideas_file, existing_count, dim):
+    """Load the existing ideas' embeddings, rebuilding the sidecar when it's stale
+    
+    The sidecar is only trusted when it has one row per idea in the file and was
+    built with the current embedding model (same dimension).
+    """
+    import numpy as np
+    
+    sidecar = embeddings_sidecar_path(ideas_file)
+    if os.path.exists(sidecar):
+        try:
+            embeddings = np.load(sidecar)
+            if embeddings.shape == (existing_count, dim):
+                return embeddings
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠ Ignoring unreadable embeddings cache '{sidecar}': {e}")
+    
+    log.info(f"Embedding {existing_count} existing ideas (cached in '{sidecar}')...")
+    existing_ideas = read_ideas_file(ideas_file)
+    embeddings = embed_texts([idea_text(idea) for idea in existing_ideas])
+    write_idea_embeddings(ideas_file, embeddings)
+    return embeddings
+
+
+def write_idea_embeddings(ideas_file, embeddings):
+    """Atomically replace the embeddings sidecar of ideas_file"""
+    import numpy as np
+    
+    sidecar = embeddings_sidecar_path(ideas_file)
+    tmp_path = sidecar + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(tmp_path, sidecar)
+
+
+def drop_duplicate_ideas(new_ideas, existing_count, ideas_file='ideas.json'):
+    """Drop new ideas too similar to an idea already in ideas_file
+    
+    Args:
+        new_ideas: Ranked ideas, before renumbering
+        existing_count: Number of ideas already in ideas_file
+        ideas_file: The ideas corpus the sidecar embeddings belong to
+    
+    Returns:
+        (kept_ideas, kept_embeddings); pass kept_embeddings to save_ideas_to_file
+    """
+    if not new_ideas or not DEDUPLICATE_IDEAS:
+        return new_ideas, None
+    
+    try:
+        embeddings = embed_texts([idea_text(idea) for idea in new_ideas])
+        if not existing_count:
+            return new_ideas, embeddings
+        existing = load_idea_embeddings(ideas_file, existing_count, embeddings.shape[1])
+    except Exception as e:
+        log.warning(f"⚠ Skipping duplicate check, couldn't embed ideas: {e}")
+        return new_ideas, None
+    
+    # One (n_new, d) @ (d, n_existing) product; rows are normalized, so this is cosine similarity
+    max_similarity = (embeddings @ existing.T).max(axis=1)
+    keep = max_similarity < DUPLICATE_SIMILARITY
+    
+    for idea, similarity in zip(new_ideas, max_similarity):
+        if similarity >= DUPLICATE_SIMILARITY:
+            log.info(f"  Dropped near-duplicate: '{idea.get('idea', 'N/A')}' (similarity {similarity:.2f})")
+    
+    kept_ideas = [idea for idea, kept in zip(new_ideas, keep) if kept]
+    if len(kept_ideas) < len(new_ideas):
+        log.info(f"✓ Kept {len(kept_ideas)} of {len(new_ideas)} ideas after the duplicate check")
+    
+    return kept_ideas, embeddings[keep]
+
+
 def renumber_and_append_ids(new_ideas, start_id):
     """Renumber IDs for new ideas starting from start_id"""
     
-    print("\n" + "="*60)
-    print("STEP 3: RENUMBERING NEW IDs")
-    print("="*60 + "\n")
+    log.info("\n" + "="*60)
+    log.info("\nSTEP 3: RENUMBERING NEW IDs")
+    log.info("="*60 + "\n")
     
-    print(f"Starting ID for new ideas: {start_id}")
+    log.info(f"Starting ID for new ideas: {start_id}")
     
     renumbered_ideas = []
     
@@ -490,102 +1518,155 @@ def renumber_and_append_ids(new_ideas, start_id):
         old_id = idea.get('id', 'N/A')
         idea['id'] = idx
         renumbered_ideas.append(idea)
-        print(f"  New ID {idx}: '{idea.get('idea', 'N/A')}' (Old ID: {old_id})")
+        log.info(f"  New ID {idx}: '{idea.get('idea', 'N/A')}' (Old ID: {old_id})")
     
-    print(f"\n✓ Successfully renumbered {len(renumbered_ideas)} new ideas")
+    log.info(f"\n✓ Successfully renumbered {len(renumbered_ideas)} new ideas")
     
     return renumbered_ideas
 
 
 
-def save_ideas_to_file(existing_ideas, new_ideas, output_file='ideas.json'):
-    """Append new ideas to existing ideas and save to JSON file"""
+def save_ideas_to_file(existing_count, new_ideas, output_file='ideas.json', embeddings=None):
+    """Append new ideas after the existing_count ideas already in the JSON file
+    
+    When the new ideas' embeddings are given, they're appended to the sidecar too.
+    """
     
     try:
-        print(f"\n{'='*60}")
-        print(f"STEP 4: SAVING TO FILE: {output_file}")
-        print(f"{'='*60}\n")
+        log.info(f"\n{'='*60}")
+        log.info(f"\nSTEP 4: SAVING TO FILE: {output_file}")
+        log.info(f"{'='*60}\n")
         
-        # Combine existing and new ideas
-        combined_ideas = existing_ideas + new_ideas
+        total_ideas = existing_count + len(new_ideas)
         
-        print(f"  Existing ideas: {len(existing_ideas)}")
-        print(f"  New ideas: {len(new_ideas)}")
-        print(f"  Total ideas: {len(combined_ideas)}")
+        log.info(f"  Existing ideas: {existing_count}")
+        log.info(f"  New ideas: {len(new_ideas)}")
+        log.info(f"  Total ideas: {total_ideas}")
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(combined_ideas, f, indent=2, ensure_ascii=False)
+        # When the file already holds ideas, only write the new ones; the existing
+        # ideas are loaded only if the file's layout doesn't allow an in-place append
+        if existing_count and os.path.exists(output_file) and append_ideas_to_file(new_ideas, output_file):
+            log.info(f"\n✓ Appended {len(new_ideas)} new ideas to '{output_file}'")
+        else:
+            if existing_count:
+                existing_ideas = read_ideas_file(output_file)
+            else:
+                existing_ideas = []
+                if os.path.exists(output_file) and os.path.getsize(output_file) > 2:
+                    # The file couldn't be read as ideas; keep a copy instead of losing it
+                    shutil.copy2(output_file, output_file + '.bak')
+                    log.warning(f"⚠ Kept a backup of the unreadable file: {output_file}.bak")
+            write_json_file(output_file, existing_ideas + new_ideas)
         
-        print(f"\n✓ Successfully saved {len(combined_ideas)} total ideas to '{output_file}'")
+        log.info(f"\n✓ Successfully saved {total_ideas} total ideas to '{output_file}'")
         
         # Verify file
         if os.path.exists(output_file):
             file_size = os.path.getsize(output_file)
-            print(f"✓ File verified: {output_file} ({file_size} bytes)")
+            log.info(f"✓ File verified: {output_file} ({file_size} bytes)")
         else:
-            print(f"✗ Warning: File {output_file} was not created!")
+            log.error(f"✗ Warning: File {output_file} was not created!")
             return False
         
+        if embeddings is not None:
+            save_new_idea_embeddings(output_file, existing_count, embeddings)
+        
         return True
         
     except Exception as e:
-        print(f"✗ Error saving to file: {str(e)}")
+        log.error(f"✗ Error saving to file: {str(e)}")
         return False
 
 
 
+def save_new_idea_embeddings(ideas_file, existing_count, embeddings):
+    """Append the new ideas' embeddings to the sidecar, if it matches the existing ideas"""
+    import numpy as np
+    
+    sidecar = embeddings_sidecar_path(ideas_file)
+    try:
+        if existing_count:
+            existing = np.load(sidecar)
+            if existing.shape[0] != existing_count or existing.shape[1] != embeddings.shape[1]:
+                return  # Stale; it's rebuilt on the next duplicate check
+            embeddings = np.vstack([existing, embeddings])
+        write_idea_embeddings(ideas_file, embeddings)
+    except (OSError, ValueError) as e:
+        log.warning(f"⚠ Couldn't update embeddings cache '{sidecar}': {e}")
+
+
+
 def main():
     """Main execution function"""
     
+    # Before the local ranker imports numpy or torch
+    limit_compute_threads()
+    
     # Initialize the provider manager
     manager = APIProviderManager()
     
     # Setup client with fallback
     if not manager.setup_with_fallback():
-        print("\n✗ Failed to initialize any API provider")
-        print("\nTroubleshooting tips:")
-        print("  • For NVIDIA: Check NVIDIA_API_KEY in .env file")
-        print("  • For G4F: Install g4f library (pip install -U g4f)")
-        print("  • For OpenAI: Check OPENAI_API_KEY in .env file")
+        log.error("\n✗ Failed to initialize any API provider")
+        log.info("\nTroubleshooting tips:")
+        log.info("  • For NVIDIA: Check NVIDIA_API_KEY in .env file")
+        log.info("  • For G4F: Install g4f library (pip install -U g4f)")
+        log.info("  • For OpenAI: Check OPENAI_API_KEY in .env file")
         sys.exit(1)
     
     # Load existing ideas and get max ID
-    existing_ideas, max_existing_id = load_existing_ideas('ideas.json')
-    
-    # Step 1: Generate initial ideas
-    initial_ideas = generate_initial_ideas(manager)
+    existing_count, max_existing_id = load_existing_ideas('ideas.json')
     
-    if not initial_ideas:
-        print("✗ Failed to generate initial ideas. Exiting.")
-        sys.exit(1)
-    
-    # Step 2: Rank and filter ideas
-    ranked_ideas = rank_and_filter_ideas(manager, initial_ideas)
+    try:
+        # Steps 1 and 2 in one request where the provider allows it
+        ranked_ideas = None
+        if COMBINED_IDEA_CALL and manager.supports_structured_output():
+            ranked_ideas = generate_and_rank_ideas(manager)
+        
+        if not ranked_ideas:
+            # Step 1: Generate initial ideas
+            initial_ideas = generate_initial_ideas(manager)
+            
+            if not initial_ideas:
+                log.error("✗ Failed to generate initial ideas. Exiting.")
+                sys.exit(1)
+            
+            # Step 2: Rank and filter ideas
+            ranked_ideas = rank_and_filter_ideas(manager, initial_ideas)
+            
+            if not ranked_ideas:
+                log.error("✗ Failed to rank ideas. Using initial ideas instead...")
+                ranked_ideas = initial_ideas
+    finally:
+        manager.close()
     
+    # Drop ideas that repeat one already in the file
+    ranked_ideas, embeddings = drop_duplicate_ideas(ranked_ideas, existing_count, 'ideas.json')
     if not ranked_ideas:
-        print("✗ Failed to rank ideas. Using initial ideas instead...")
-        ranked_ideas = initial_ideas
+        log.warning("\n⚠ Every new idea duplicates an existing one. Nothing to save.")
+        return
     
     # Step 3: Renumber IDs starting from max_existing_id + 1
     new_ideas = renumber_and_append_ids(ranked_ideas, start_id=max_existing_id + 1)
     
     # Step 4: Append to existing ideas and save to file
-    if save_ideas_to_file(existing_ideas, new_ideas, output_file='ideas.json'):
-        print("\n" + "="*60)
-        print("SUMMARY")
-        print("="*60)
-        print(f"✓ Total ideas in file: {len(existing_ideas) + len(new_ideas)}")
-        print(f"✓ ID range: 1 to {max_existing_id + len(new_ideas)}")
-        
-        print("\nFirst new idea added:")
-        print("-" * 60)
-        print(json.dumps(new_ideas[0], indent=2))
-        print("-" * 60)
-        
-        print("\n✓ Script completed successfully!")
-        print(f"✓ Check 'ideas.json' for all ideas")
+    if save_ideas_to_file(existing_count, new_ideas, output_file='ideas.json', embeddings=embeddings):
+        clear_checkpoints()
+        log.info("\n" + "="*60)
+        log.info("\nSUMMARY")
+        log.info("="*60)
+        log.info(f"✓ Total ideas in file: {existing_count + len(new_ideas)}")
+        log.info(f"✓ ID range: 1 to {max_existing_id + len(new_ideas)}")
+        
+        log.info("\nFirst new idea added:")
+        log.info("-" * 60)
+        log.info(json.dumps(new_ideas[0], indent=2))
+        log.info("-" * 60)
+        
+        log.info("\n✓ Script completed successfully!")
+        log.info(f"✓ Check 'ideas.json' for all ideas")
     else:
-        print("\n✗ Script completed with errors")
+        log.error("\n✗ Script completed with errors")
         sys.exit(1)
 
 
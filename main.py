@@ -1,20 +1,92 @@
 import os
 import sys
-import json
+import atexit
+import functools
+import logging
+import hashlib
+import importlib.util
+import heapq
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from logging.handlers import MemoryHandler
+from operator import itemgetter
 from pathlib import Path
 from dotenv import load_dotenv
 
+try:
+    import readline  # Optional: line editing and history for the menu prompt
+except ImportError:
+    pass
+
 
 
 # Load environment variables
 load_dotenv()
 
 
+# Pipeline output is batched in memory and written at stage boundaries;
+# warnings and errors are written immediately
+log = logging.getLogger("pipeline")
+
+
+class _BufferedStdoutHandler(MemoryHandler):
+    """MemoryHandler that writes everything it buffered to stdout with one write and one flush
+    
+    The stock MemoryHandler passes records to its target one at a time, and a
+    StreamHandler target flushes stdout after every record.
+    """
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if not self.buffer:
+                return
+            lines = []
+            for record in self.buffer:
+                try:
+                    lines.append(self.format(record) + "\n")
+                except Exception:
+                    self.handleError(record)
+            self.buffer.clear()
+            # Written under the lock so batches flushed by different threads don't interleave
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
+        finally:
+            self.release()
+
+
+def _setup_logging():
+    """Buffer this module's log records and write them to stdout in batches"""
+    if log.handlers:
+        return
+    
+    handler = _BufferedStdoutHandler(capacity=100, flushLevel=logging.WARNING)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+_setup_logging()
+
+
+def flush_log():
+    """Write out buffered log records, e.g. before other modules print or input is read"""
+    for handler in log.handlers:
+        handler.flush()
+
+
+def prompt(message):
+    """input() that first shows everything logged so far"""
+    flush_log()
+    return input(message)
+
+# Size the BLAS and tokenizer thread pools before edit.py imports numpy
+from ideas import limit_compute_threads
+limit_compute_threads()
 
-# Import the main functions from each module
-from story import process_first_pending_idea
-from voices import process_storyboard_audio, find_latest_storyboard
-from edit import create_video_with_audio, find_latest_audio_folder
 
 
 # Import functions from ideas.py for generating new ideas
@@ -22,27 +94,491 @@ from ideas import (
     APIProviderManager, 
     load_existing_ideas, 
     generate_initial_ideas, 
+    generate_and_rank_ideas,
+    COMBINED_IDEA_CALL,
     rank_and_filter_ideas, 
+    drop_duplicate_ideas, 
     renumber_and_append_ids, 
-    save_ideas_to_file
+    save_ideas_to_file,
+    clear_checkpoints,
+    read_json_file,
+    write_json_file,
+    journal_path_for,
+    append_journal_entry,
+    replay_journal,
+    ideas_file_lock
 )
 
 
 
+def _claim_is_stale(status):
+    """Whether status is an "in_progress:<pid>" claim by a process that no longer exists"""
+    if os.name != "posix" or not isinstance(status, str) or not status.startswith("in_progress:"):
+        return False
+    try:
+        pid = int(status.split(":", 1)[1])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # Exists, but belongs to another user
+    return False
+
+
+class _IdeasStore:
+    """In-memory copy of ideas.json shared by the pipeline stages
+    
+    Status updates are appended to an ideas.journal next to the file instead of
+    rewriting it; the journal is replayed over ideas.json on load and folded
+    back into it every JOURNAL_COMPACT_EVERY entries, at exit, and before
+    ideas.py or story.py read the file themselves. Both files are only read
+    again when they changed on disk. Pending IDs are kept in a min-heap, and
+    the lowest one is persisted to ideas_index.json so a cold start can find
+    it without reading ideas.json.
+    """
+    
+    def __init__(self, path="ideas.json"):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + "_index.json"
+        self.journal_path = journal_path_for(path)
+        self._ideas = []
+        self._by_id = {}
+        self._pending = []  # Min-heap of IDs; entries whose idea is no longer pending are skipped lazily
+        self._journal_entries = 0
+        self._lock = threading.RLock()
+        self._file_lock = ideas_file_lock(path)
+        self._stamp = None
+        self._index_key = None  # (next_pending_id, max_id) last written to the index
+    
+    def _file_stamp(self):
+        """(mtime_ns, size) of ideas.json and of the journal, or None for a missing journal"""
+        stat = os.stat(self.path)
+        try:
+            journal_stat = os.stat(self.journal_path)
+            journal_stamp = [journal_stat.st_mtime_ns, journal_stat.st_size]
+        except FileNotFoundError:
+            journal_stamp = None
+        return [[stat.st_mtime_ns, stat.st_size], journal_stamp]
+    
+    def _is_pending(self, idea_id):
+        idea = self._by_id.get(idea_id)
+        return idea is not None and idea.get('publishing_status') == 'pending'
+    
+    def _pending_head(self):
+        while self._pending and not self._is_pending(self._pending[0]):
+            heapq.heappop(self._pending)
+        return self._pending[0] if self._pending else None
+    
+    def _write_index(self, force=False):
+        """Persist the lowest pending ID, tagged with the ideas.json version it describes
+        
+        Only written when the lowest pending ID or the highest ID changed, unless forced;
+        a stale index is just ignored, so it isn't synced to disk either.
+        """
+        index_key = (self._pending_head(), max(self._by_id, default=0))
+        if index_key == self._index_key and not force:
+            return
+        try:
+            write_json_file(self.index_path, {
+                "next_pending_id": index_key[0],
+                "max_id": index_key[1],
+                "ideas_stamp": self._stamp
+            }, durable=False)
+            self._index_key = index_key
+        except OSError as e:
+            log.warning(f"⚠️  Could not write {self.index_path}: {e}")
+    
+    def _replay_journal(self):
+        """Apply the journal's updates to the ideas just read from ideas.json"""
+        self._journal_entries = replay_journal(self.journal_path, self._by_id)
+    
+    def _append_journal(self, idea_id, fields):
+        """Durably record an update: one JSON line, flushed and fsynced"""
+        append_journal_entry(self.journal_path, idea_id, fields)
+        self._journal_entries += 1
+    
+    def _compact(self):
+        """Write the replayed ideas back to ideas.json and start a new journal"""
+        write_json_file(self.path, self._ideas)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._journal_entries = 0
+        self._stamp = self._file_stamp()
+    
+    def _after_write(self):
+        if self._journal_entries >= JOURNAL_COMPACT_EVERY:
+            self._compact()
+        else:
+            self._stamp = self._file_stamp()
+        self._write_index()
+    
+    def load(self):
+        """Return the ideas, reading the files only if they changed since the last read or write"""
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                self._ideas = read_json_file(self.path)
+                self._by_id = {idea['id']: idea for idea in self._ideas}
+                self._replay_journal()
+                self._pending = [idea['id'] for idea in self._ideas if idea.get('publishing_status') == 'pending']
+                heapq.heapify(self._pending)
+                self._stamp = stamp
+                self._write_index()
+            return self._ideas
+    
+    def compact(self):
+        """Fold any journaled updates into ideas.json so other readers of the file see them"""
+        if not os.path.exists(self.path):
+            return  # Nothing to fold into, and no reason to leave a lock file behind
+        with self._lock, (self._file_lock or nullcontext()):
+            try:
+                self.load()
+            except FileNotFoundError:
+                return
+            if self._journal_entries:
+                self._compact()
+                # The next run starts from this version, so tag the index with it
+                self._write_index(force=True)
+    
+    def pending(self, limit=None):
+        """Copies of up to limit pending ideas, lowest ID first"""
+        with self._lock:
+            self.load()
+            pending_ids = set(idea_id for idea_id in self._pending if self._is_pending(idea_id))
+            # Only the first few are usually wanted: a partial selection instead of a full sort
+            pending_ids = sorted(pending_ids) if limit is None else heapq.nsmallest(limit, pending_ids)
+            return [dict(self._by_id[idea_id]) for idea_id in pending_ids]
+    
+    def first_pending(self):
+        """ID of the pending idea with the lowest ID, or None"""
+        with self._lock:
+            if self._stamp is None:
+                # Cold start: trust the index if neither ideas.json nor the journal changed since it was written
+                try:
+                    index = read_json_file(self.index_path)
+                    if index.get("ideas_stamp") == self._file_stamp():
+                        return index.get("next_pending_id")
+                except (OSError, ValueError, AttributeError):
+                    pass
+            self.load()
+            return self._pending_head()
+    
+    def get(self, idea_id):
+        """A copy of the idea with idea_id, or None"""
+        with self._lock:
+            self.load()
+            idea = self._by_id.get(idea_id)
+            return dict(idea) if idea is not None else None
+    
+    def with_status(self, *statuses):
+        """Copies of the ideas whose status is one of statuses, lowest ID first"""
+        with self._lock:
+            self.load()
+            matching = [idea for idea in self._ideas if idea.get('publishing_status') in statuses]
+            return [dict(idea) for idea in sorted(matching, key=itemgetter('id'))]
+    
+    def has_file_lock(self):
+        """Whether writes are also locked against other processes"""
+        return self._file_lock is not None
+    
+    def _release_stale_claims(self):
+        """Return ideas claimed by a run whose process is gone to pending"""
+        released = False
+        for idea in self._ideas:
+            if _claim_is_stale(idea.get('publishing_status')):
+                idea['publishing_status'] = 'pending'
+                heapq.heappush(self._pending, idea['id'])
+                self._append_journal(idea['id'], {'publishing_status': 'pending'})
+                released = True
+        return released
+    
+    def claim_pending(self, limit, owner):
+        """Mark up to limit pending ideas with the status owner and return copies of them
+        
+        Ideas still claimed by a run that died are pending again.
+        """
+        with self._lock, (self._file_lock or nullcontext()):
+            self.load()
+            released = self._release_stale_claims()
+            claimed = self.pending(limit)
+            for idea in claimed:
+                idea['publishing_status'] = owner
+                self._by_id[idea['id']]['publishing_status'] = owner
+                self._append_journal(idea['id'], {'publishing_status': owner})
+            if claimed or released:
+                self._after_write()
+            return claimed
+    
+    def update(self, idea_id, **fields):
+        """Set fields on an idea and journal the change; False if there's no such idea"""
+        with self._lock, (self._file_lock or nullcontext()):
+            self.load()
+            idea = self._by_id.get(idea_id)
+            if idea is None:
+                return False
+            idea.update(fields)
+            if idea.get('publishing_status') == 'pending':
+                heapq.heappush(self._pending, idea_id)
+            self._append_journal(idea_id, fields)
+            self._after_write()
+            return True
+
+
+# Pipeline stages run in their own threads and share this store
+ideas_store = _IdeasStore()
+# Journaled updates are folded into ideas.json for anything that reads it after we exit
+atexit.register(ideas_store.compact)
+
+
+# API provider manager shared by every generate_new_ideas call, set up on first use
+_manager_cache = None
+_manager_lock = threading.Lock()
+
+# Connections used to download the background video in parallel byte ranges
+BG_DOWNLOAD_CONCURRENCY = max(1, int(os.getenv('BG_DOWNLOAD_CONCURRENCY', '8')))
+# Encoder settings passed to create_video_with_audio: use every core, fast x264 preset
+FFMPEG_ENCODE_OPTIONS = {
+    "ffmpeg_threads": os.cpu_count(),
+    "preset": os.getenv("FFMPEG_PRESET", "veryfast")
+}
+
+# (path, description) pairs checked by check_required_files.
+# ideas.json and background.mp4 aren't required: both are created when missing
+REQUIRED_FILES = (
+    (".env", "Environment configuration file"),
+    ("assets/background.mp3", "Background music"),
+)
+OPTIONAL_FILES = (
+    ("assets/person_1.png", "Person 1 character image"),
+    ("assets/person_2.png", "Person 2 character image"),
+    ("assets/person_1.mp3", "Person 1 voice reference (for Chatterbox TTS)"),
+    ("assets/person_2.mp3", "Person 2 voice reference (for Chatterbox TTS)"),
+)
+OUTPUT_FOLDERS = ("story_board", "audio_output", "final_videos", "assets")
+
+# Voice-over jobs run at once in pipelined mode; videos are always encoded one at a time
+PIPELINE_TTS_WORKERS = max(1, int(os.getenv("PIPELINE_TTS_WORKERS", "2")))
+
+# Storyboard requests in flight at once in pipelined mode, so the LLM stays ahead of the voice-over workers
+PIPELINE_STORYBOARD_WORKERS = max(1, int(os.getenv("PIPELINE_STORYBOARD_WORKERS", "2")))
+
+# Records the assets that passed the last successful check_required_files
+PIPELINE_STATE_FILE = ".pipeline_state.json"
+
+# Write the next pending idea's storyboard while the current video encodes (.env, default no:
+# it spends an LLM request on an idea nobody asked to run yet)
+PREFETCH_NEXT_STORYBOARD = os.getenv("PREFETCH_NEXT_STORYBOARD", "no").lower() == "yes"
+
+# Statuses of ideas that stopped part-way and that --resume picks up again
+RESUMABLE_STATUSES = ("storyboard_generated", "error")
+
+# Journaled status updates kept before ideas.json is rewritten with them
+JOURNAL_COMPACT_EVERY = 50
+
+# gdown (listed in requirements.txt) is the fallback downloader; checked without importing it
+GDOWN_AVAILABLE = importlib.util.find_spec("gdown") is not None
+
+
+
+# Banners are built once; each header or step is then a single log record
+HEADER_TEMPLATE = "\n{bar}\n  {{}}\n{bar}\n".format(bar="=" * 70)
+STEP_TEMPLATE = "\n[STEP {{}}/{{}}] {{}}\n{bar}".format(bar="-" * 70)
+
 
 def print_header(message):
     """Print a formatted header"""
-    print(f"\n{'='*70}")
-    print(f"  {message}")
-    print(f"{'='*70}\n")
+    log.info(HEADER_TEMPLATE.format(message))
+    flush_log()
 
 
 
 
 def print_step(step_num, total_steps, message):
     """Print a formatted step message"""
-    print(f"\n[STEP {step_num}/{total_steps}] {message}")
-    print(f"{'-'*70}")
+    log.info(STEP_TEMPLATE.format(step_num, total_steps, message))
+    flush_log()
+
+
+
+
+def _stage_module(name):
+    """Import story, voices or edit on first use
+    
+    story.py and voices.py connect their API and TTS clients at import and edit.py
+    loads numpy and Pillow, none of which --check or --generate-ideas need.
+    """
+    if name not in sys.modules:
+        flush_log()  # Their setup messages are printed, not logged
+    return importlib.import_module(name)
+
+
+
+
+# kind -> (mtime_ns of its output folder, latest path found there), see _find_latest
+_latest_cache = {}
+
+
+
+
+def _find_latest(kind, folder, module_name, function_name):
+    """Newest storyboard or audio folder, rescanned only when folder's entries changed
+    
+    Everything this process generates goes through the stage wrappers below,
+    which clear the cache, since rewriting an existing file doesn't change
+    the folder's own mtime.
+    """
+    try:
+        stamp = os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _latest_cache.get(kind)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    path = getattr(_stage_module(module_name), function_name)()
+    _latest_cache[kind] = (stamp, path)
+    return path
+
+
+
+
+def process_first_pending_idea():
+    """story.process_first_pending_idea, imported on first use"""
+    try:
+        return _stage_module("story").process_first_pending_idea()
+    finally:
+        _latest_cache.clear()
+
+
+
+
+def create_storyboard_for_idea(idea):
+    """story.create_storyboard_for_idea, imported on first use"""
+    try:
+        return _stage_module("story").create_storyboard_for_idea(idea)
+    finally:
+        _latest_cache.clear()
+
+
+
+
+def process_storyboard_audio(storyboard_path):
+    """voices.process_storyboard_audio, imported on first use"""
+    try:
+        return _stage_module("voices").process_storyboard_audio(storyboard_path)
+    finally:
+        _latest_cache.clear()
+
+
+
+
+def find_latest_storyboard():
+    """voices.find_latest_storyboard, imported on first use and cached"""
+    return _find_latest("storyboard", "story_board", "voices", "find_latest_storyboard")
+
+
+
+
+def create_video_with_audio(audio_folder, **options):
+    """edit.create_video_with_audio, imported on first use"""
+    return _stage_module("edit").create_video_with_audio(audio_folder, **options)
+
+
+
+
+def find_latest_audio_folder():
+    """edit.find_latest_audio_folder, imported on first use and cached"""
+    return _find_latest("audio", "audio_output", "edit", "find_latest_audio_folder")
+
+
+
+
+def download_in_ranges(url, path, connections=BG_DOWNLOAD_CONCURRENCY):
+    """Download url to path over several connections, each fetching one byte range
+    
+    Returns False without creating path when the server doesn't serve ranges.
+    """
+    import requests
+    
+    with requests.Session() as session:
+        # A one-byte range request tells us whether ranges work and the total size
+        with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=30) as probe:
+            content_range = probe.headers.get("Content-Range", "")
+            content_type = probe.headers.get("Content-Type", "")
+            final_url = probe.url
+            if probe.status_code != 206 or "/" not in content_range or content_type.startswith("text/html"):
+                return False
+        total = int(content_range.rsplit("/", 1)[1])
+        
+        part_size = -(-total // connections)
+        ranges = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+        tmp_path = path + ".part"
+        # One pre-sized file shared by every range; each thread writes at its own offsets
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        seek_lock = threading.Lock()
+        
+        def write_at(data, offset):
+            view = memoryview(data)
+            while view:
+                if hasattr(os, "pwrite"):
+                    written = os.pwrite(fd, view, offset)
+                else:
+                    # No pwrite on Windows: seek and write under a lock instead
+                    with seek_lock:
+                        os.lseek(fd, offset, os.SEEK_SET)
+                        written = os.write(fd, view)
+                view = view[written:]
+                offset += written
+        
+        def fetch(byte_range):
+            start, end = byte_range
+            headers = {"Range": f"bytes={start}-{end}"}
+            with session.get(final_url, headers=headers, stream=True, timeout=60) as response:
+                if response.status_code != 206:
+                    raise IOError(f"Range {start}-{end} returned HTTP {response.status_code}")
+                written = 0
+                for chunk in response.iter_content(1 << 20):
+                    write_at(chunk, start + written)
+                    written += len(chunk)
+            if written != end - start + 1:
+                raise IOError(f"Range {start}-{end} ended after {written} bytes")
+        
+        try:
+            os.ftruncate(fd, total)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                list(pool.map(fetch, ranges))
+        except Exception:
+            os.close(fd)
+            os.remove(tmp_path)
+            raise
+        os.close(fd)
+    
+    os.replace(tmp_path, path)
+    return True
+
+
+
+
+def drop_page_cache(path):
+    """Flush a freshly downloaded file and drop it from the page cache (Linux only)
+    
+    ffmpeg reads only a short slice of the background video per render, so keeping
+    the whole download cached just pushes out pages other processes need.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+    try:
+        os.fdatasync(fd)  # Dirty pages can't be dropped until they're written
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
 
@@ -52,109 +588,238 @@ def download_background_video():
     background_path = "assets/background.mp4"
     
     # Check if file already exists
-    if os.path.exists(background_path):
-        print(f"  ✓ {background_path} already exists")
+    if has_background_video():
+        log.info(f"  ✓ {background_path} already exists")
         return True
     
-    print(f"  ○ {background_path} not found. Downloading from Google Drive...")
+    log.info(f"  ○ {background_path} not found. Downloading from Google Drive...")
+    
+    # Extract file ID from the Google Drive URL
+    # URL format: https://drive.google.com/file/d/FILE_ID/view?usp=sharing
+    drive_url = "https://drive.google.com/file/d/1zT99cDojL0r4FNylbZE06get46-njybj/view?usp=sharing"
+    file_id = "1zT99cDojL0r4FNylbZE06get46-njybj"
     
+    # Ensure assets folder exists
+    os.makedirs("assets", exist_ok=True)
+    
+    # Fetch byte ranges over several connections; gdown below is the fallback
     try:
-        # Install gdown if not available
-        try:
-            import gdown
-        except ImportError:
-            print("    Installing gdown library...")
-            import subprocess
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "gdown", "-q"])
-            import gdown
-        
-        # Extract file ID from the Google Drive URL
-        # URL format: https://drive.google.com/file/d/FILE_ID/view?usp=sharing
-        drive_url = "https://drive.google.com/file/d/1zT99cDojL0r4FNylbZE06get46-njybj/view?usp=sharing"
-        file_id = "1zT99cDojL0r4FNylbZE06get46-njybj"
-        
-        # Ensure assets folder exists
-        os.makedirs("assets", exist_ok=True)
+        direct_url = f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t"
+        if download_in_ranges(direct_url, background_path):
+            invalidate_asset_cache()
+            drop_page_cache(background_path)
+            log.info(f"  ✓ Successfully downloaded {background_path} ({BG_DOWNLOAD_CONCURRENCY} connections)")
+            return True
+        log.info("    Server doesn't support range requests, using gdown...")
+    except Exception as e:
+        log.info(f"    Parallel download failed ({e}), using gdown...")
+    
+    if not GDOWN_AVAILABLE:
+        log.error("  ✗ gdown is not installed. Install the download dependencies with: pip install requests gdown")
+        log.info(f"    Or download manually from: {drive_url}")
+        log.info(f"    And save it to: {background_path}")
+        return False
+    
+    try:
+        import gdown  # Deferred: only needed when the video is missing
         
         # Download the file
         download_url = f"https://drive.google.com/uc?id={file_id}"
         gdown.download(download_url, background_path, quiet=False)
         
-        if os.path.exists(background_path):
-            print(f"  ✓ Successfully downloaded {background_path}")
+        invalidate_asset_cache()
+        if has_background_video():
+            drop_page_cache(background_path)
+            log.info(f"  ✓ Successfully downloaded {background_path}")
             return True
         else:
-            print(f"  ✗ Download failed: File not created")
+            log.error(f"  ✗ Download failed: File not created")
             return False
             
     except Exception as e:
-        print(f"  ✗ Error downloading background video: {str(e)}")
-        print(f"    Please manually download from: {drive_url}")
-        print(f"    And save it to: {background_path}")
+        log.error(f"  ✗ Error downloading background video: {str(e)}")
+        log.info(f"    Please manually download from: {drive_url}")
+        log.info(f"    And save it to: {background_path}")
         return False
 
 
 
 
-def check_required_files():
-    """Check if all required files and folders exist (excluding ideas.json)"""
-    print_header("Checking Required Files and Folders")
+# One download at a time: a second request finds the video already there
+_download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background-download")
+
+
+
+
+def start_background_download():
+    """Start downloading the background video on a worker thread
+    
+    Returns:
+        A future resolving to download_background_video()'s result, or None if
+        the video is already present
+    """
+    if has_background_video():
+        return None
+    
+    return _download_executor.submit(download_background_video)
+
+
+
+
+def wait_for_background_video(download_future):
+    """Block until a background download started earlier finishes; True if the video is there"""
+    if download_future is not None:
+        log.info("\nWaiting for the background video download...")
+        try:
+            download_future.result()
+        except Exception as e:
+            log.error(f"  ✗ Error downloading background video: {e}")
+        invalidate_asset_cache()
+    return has_background_video()
+
+
+
+
+def scan_folder(folder):
+    """Names of the entries in a folder, or an empty set if it doesn't exist"""
+    try:
+        with os.scandir(folder) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+
+
+@functools.lru_cache(maxsize=1)
+def _scan_assets():
+    """Stats of the files in assets/ by name, listed once per process until invalidate_asset_cache is called"""
+    stats = {}
+    try:
+        with os.scandir("assets") as entries:
+            for entry in entries:
+                try:
+                    stats[entry.name] = entry.stat()
+                except FileNotFoundError:
+                    pass  # A dangling symlink
+    except FileNotFoundError:
+        pass
+    return stats
+
+
+
+
+def invalidate_asset_cache():
+    """Forget the cached assets/ listing, e.g. when the user asks for a fresh check"""
+    _scan_assets.cache_clear()
+
+
+
+
+def has_background_video():
+    """Whether assets/background.mp4 exists and isn't empty, according to the cached assets/ listing
     
-    # ========== MODIFIED: Removed both ideas.json AND background.mp4 from required files ==========
-    required_files = {
-        ".env": "Environment configuration file",
-        "assets/background.mp3": "Background music"
-    }
-    # ==============================================================================================
+    An interrupted download can leave an empty file behind, which the encoder can't use.
+    """
+    stat = _scan_assets().get("background.mp4")
+    return stat is not None and stat.st_size > 0
+
+
+
+
+def required_files_state_key(download_background):
+    """Fingerprint of everything check_required_files looks at: asset names and mtimes, and the project root's entries"""
+    try:
+        with os.scandir("assets") as entries:
+            assets = sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries)
+    except FileNotFoundError:
+        assets = []
+    root = sorted(scan_folder(".") & ({path for path, _ in REQUIRED_FILES} | set(OUTPUT_FOLDERS)))
+    state = repr((download_background, assets, root))
+    return hashlib.sha256(state.encode("utf-8")).hexdigest()
+
+
+
+
+def check_required_files(download_background=True, force=False):
+    """Check if all required files and folders exist (excluding ideas.json)
     
-    optional_files = {
-        "assets/person_1.png": "Person 1 character image",
-        "assets/person_2.png": "Person 2 character image",
-        "assets/person_1.mp3": "Person 1 voice reference (for Chatterbox TTS)",
-        "assets/person_2.mp3": "Person 2 voice reference (for Chatterbox TTS)"
-    }
+    Pass download_background=False when the background video is being downloaded
+    separately (see start_background_download), and force=True to check even if
+    nothing changed since the last successful check.
+    """
+    print_header("Checking Required Files and Folders")
+    
+    # Nothing to re-check if the files are unchanged since the last successful check
+    state_key = required_files_state_key(download_background)
+    try:
+        if not force and read_json_file(PIPELINE_STATE_FILE).get("key") == state_key:
+            log.info("✓ Required files unchanged since the last successful check")
+            return True
+    except (OSError, ValueError, AttributeError):
+        pass
     
     all_good = True
     
+    # Download the background video while the other files are checked
+    download_future = start_background_download() if download_background else None
+    
+    # One directory listing per folder instead of a stat call per file
+    present = {".": scan_folder("."), "assets": _scan_assets()}
+    
+    def is_present(file_path):
+        folder, name = os.path.split(file_path)
+        return name in present[folder or "."]
+    
     # Check required files
-    print("Required files:")
-    for file_path, description in required_files.items():
-        exists = os.path.exists(file_path)
+    log.info("Required files:")
+    for file_path, description in REQUIRED_FILES:
+        exists = is_present(file_path)
         status = "✓" if exists else "✗"
-        print(f"  {status} {file_path} - {description}")
+        log.info(f"  {status} {file_path} - {description}")
         if not exists:
             all_good = False
     
     # Check optional files
-    print("\nOptional files:")
-    for file_path, description in optional_files.items():
-        exists = os.path.exists(file_path)
+    log.info("\nOptional files:")
+    for file_path, description in OPTIONAL_FILES:
+        exists = is_present(file_path)
         status = "✓" if exists else "○"
-        print(f"  {status} {file_path} - {description}")
+        log.info(f"  {status} {file_path} - {description}")
     
     # Create necessary folders
-    print("\nCreating output folders...")
-    folders = ["story_board", "audio_output", "final_videos", "assets"]
-    for folder in folders:
-        os.makedirs(folder, exist_ok=True)
-        print(f"  ✓ {folder}/")
+    log.info("\nCreating output folders...")
+    for folder in OUTPUT_FOLDERS:
+        if folder not in present["."]:
+            os.makedirs(folder, exist_ok=True)
+    log.info("  ✓ " + ", ".join(f"{folder}/" for folder in OUTPUT_FOLDERS))
     
     # ========== NEW: Handle background video (download if needed) ==========
-    print("\nChecking background video:")
-    download_background_video()
-    
-    # Verify background video exists after download attempt
-    if not os.path.exists("assets/background.mp4"):
-        print("  ✗ Background video is missing and could not be downloaded")
-        all_good = False
+    log.info("\nChecking background video:")
+    if download_background:
+        if download_future is None:
+            log.info("  ✓ assets/background.mp4 already exists")
+        elif not wait_for_background_video(download_future):
+            log.error("  ✗ Background video is missing and could not be downloaded")
+            all_good = False
+    elif has_background_video():
+        log.info("  ✓ assets/background.mp4 already exists")
+    else:
+        log.info("  ○ assets/background.mp4 is downloading in the background")
     # ========================================================================
     
     if not all_good:
-        print("\n⚠️  Warning: Some required files are missing!")
-        print("Please ensure all required files exist before running the pipeline.")
+        log.warning("\n⚠️  Warning: Some required files are missing!")
+        log.info("Please ensure all required files exist before running the pipeline.")
         return False
     
-    print("\n✓ All required files found!")
+    log.info("\n✓ All required files found!")
+    
+    try:
+        # Fingerprint again: the check may have created folders or downloaded the video
+        write_json_file(PIPELINE_STATE_FILE, {"ok": True, "key": required_files_state_key(download_background)})
+    except OSError as e:
+        log.warning(f"⚠️  Could not write {PIPELINE_STATE_FILE}: {e}")
     return True
 
 
@@ -162,25 +827,17 @@ def check_required_files():
 
 def update_idea_status(idea_id, status, final_output=None, error_log=""):
     """Update the status of an idea in ideas.json"""
+    fields = {'publishing_status': status}
+    if final_output:
+        fields['final_output'] = final_output
+    if error_log:
+        fields['error_log'] = error_log
+    
     try:
-        with open("ideas.json", 'r', encoding='utf-8') as f:
-            ideas = json.load(f)
-        
-        for idea in ideas:
-            if idea['id'] == idea_id:
-                idea['publishing_status'] = status
-                if final_output:
-                    idea['final_output'] = final_output
-                if error_log:
-                    idea['error_log'] = error_log
-                break
-        
-        with open("ideas.json", 'w', encoding='utf-8') as f:
-            json.dump(ideas, f, indent=2, ensure_ascii=False)
-        
+        ideas_store.update(idea_id, **fields)
         return True
     except Exception as e:
-        print(f"Error updating idea status: {e}")
+        log.info(f"Error updating idea status: {e}")
         return False
 
 
@@ -189,126 +846,310 @@ def update_idea_status(idea_id, status, final_output=None, error_log=""):
 def get_current_idea_id():
     """Get the ID of the current pending idea"""
     try:
-        with open("ideas.json", 'r', encoding='utf-8') as f:
-            ideas = json.load(f)
-        
-        ideas.sort(key=lambda x: x['id'])
-        
-        for idea in ideas:
-            if idea.get('publishing_status') == 'pending':
-                return idea['id']
-        
-        return None
+        return ideas_store.first_pending()
     except Exception as e:
-        print(f"Error reading ideas.json: {e}")
+        log.info(f"Error reading ideas.json: {e}")
         return None
 
 
 
 
+def get_pending_ideas(limit=None):
+    """Get up to limit pending ideas, lowest ID first"""
+    try:
+        return ideas_store.pending(limit)
+    except Exception as e:
+        log.info(f"Error reading ideas.json: {e}")
+        return []
+
+
+
+
+def get_provider_manager():
+    """Return the shared API provider manager, setting it up again if it isn't healthy
+    
+    Returns:
+        The APIProviderManager, or None if no provider could be initialized
+    """
+    global _manager_cache
+    with _manager_lock:
+        if _manager_cache is None or not _manager_cache.is_healthy():
+            manager = APIProviderManager()
+            if not manager.setup_with_fallback():
+                manager.close()
+                return None
+            _manager_cache = manager
+        return _manager_cache
+
+
+
+
+@atexit.register
+def _close_provider_manager():
+    """Release the shared manager's clients when the program exits"""
+    if _manager_cache is not None:
+        _manager_cache.close()
+
+
+
+
 def generate_new_ideas():
-    """Generate new ideas using the ideas.py module"""
+    """Generate new ideas using the ideas.py module
+    
+    Returns:
+        The ID of the first new pending idea, or None if generation failed
+    """
     print_header("🎯 GENERATING NEW IDEAS 🎯")
     
     try:
-        # Initialize the provider manager
-        manager = APIProviderManager()
+        # Reuse the provider manager (and its connections) from earlier runs
+        manager = get_provider_manager()
+        if manager is None:
+            log.error("❌ Failed to initialize any API provider")
+            return None
         
-        # Setup client with fallback
-        if not manager.setup_with_fallback():
-            print("❌ Failed to initialize any API provider")
-            return False
+        # ideas.py reads and appends to ideas.json directly
+        ideas_store.compact()
         
         # Load existing ideas and get max ID
-        existing_ideas, max_existing_id = load_existing_ideas('ideas.json')
+        existing_count, max_existing_id = load_existing_ideas('ideas.json')
         
-        # Step 1: Generate initial ideas
-        print("\n📝 Generating initial ideas...")
-        initial_ideas = generate_initial_ideas(manager)
+        # Steps 1 and 2 in one request where the provider allows it
+        ranked_ideas = None
+        if COMBINED_IDEA_CALL and manager.supports_structured_output():
+            log.info("\n📝 Generating and ranking ideas in one request...")
+            ranked_ideas = generate_and_rank_ideas(manager)
         
-        if not initial_ideas:
-            print("✗ Failed to generate initial ideas.")
-            return False
-        
-        # Step 2: Rank and filter ideas
-        print("\n📊 Ranking and filtering ideas...")
-        ranked_ideas = rank_and_filter_ideas(manager, initial_ideas)
+        if not ranked_ideas:
+            # Step 1: Generate initial ideas
+            log.info("\n📝 Generating initial ideas...")
+            initial_ideas = generate_initial_ideas(manager)
+            
+            if not initial_ideas:
+                log.error("✗ Failed to generate initial ideas.")
+                return None
+            
+            # Step 2: Rank and filter ideas
+            log.info("\n📊 Ranking and filtering ideas...")
+            ranked_ideas = rank_and_filter_ideas(manager, initial_ideas)
+            
+            if not ranked_ideas:
+                log.error("✗ Failed to rank ideas. Using initial ideas instead...")
+                ranked_ideas = initial_ideas
         
+        # Drop ideas that repeat one already in the file
+        ranked_ideas, embeddings = drop_duplicate_ideas(ranked_ideas, existing_count, 'ideas.json')
         if not ranked_ideas:
-            print("✗ Failed to rank ideas. Using initial ideas instead...")
-            ranked_ideas = initial_ideas
+            log.warning("⚠️  Every new idea duplicates an existing one.")
+            return None
         
         # Step 3: Renumber IDs starting from max_existing_id + 1
-        print("\n🔢 Renumbering IDs...")
+        log.info("\n🔢 Renumbering IDs...")
         new_ideas = renumber_and_append_ids(ranked_ideas, start_id=max_existing_id + 1)
         
         # Step 4: Append to existing ideas and save to file
-        print("\n💾 Saving ideas to file...")
-        if save_ideas_to_file(existing_ideas, new_ideas, output_file='ideas.json'):
-            print(f"\n✓ Successfully generated and saved {len(new_ideas)} new ideas!")
-            print(f"✓ New ideas have IDs from {max_existing_id + 1} to {max_existing_id + len(new_ideas)}")
-            return True
+        log.info("\n💾 Saving ideas to file...")
+        if save_ideas_to_file(existing_count, new_ideas, output_file='ideas.json', embeddings=embeddings):
+            clear_checkpoints()
+            log.info(f"\n✓ Successfully generated and saved {len(new_ideas)} new ideas!")
+            log.info(f"✓ New ideas have IDs from {max_existing_id + 1} to {max_existing_id + len(new_ideas)}")
+            # The caller can go straight to this idea without reading the file back
+            return next((idea['id'] for idea in new_ideas if idea.get('publishing_status') == 'pending'), None)
         else:
-            print("\n✗ Failed to save ideas to file")
-            return False
+            log.error("\n✗ Failed to save ideas to file")
+            return None
             
     except Exception as e:
-        print(f"\n✗ Error generating new ideas: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
+        log.exception(f"\n✗ Error generating new ideas: {str(e)}")
+        return None
+
+
+
+
+def saved_storyboard(idea):
+    """The storyboard recorded for an idea, if it is still on disk and not empty
+    
+    That's the one from an earlier attempt for an idea that stopped part-way, or
+    one prefetched for a still-pending idea (see prefetch_next_storyboard).
+    """
+    storyboard_path = idea.get('final_output') or ""
+    try:
+        if storyboard_path.endswith(".json") and os.path.getsize(storyboard_path) > 0:
+            return storyboard_path
+    except OSError:
+        pass
+    return None
+
+
+
+
+def saved_voice_over(storyboard_path):
+    """(audio folder, metadata) of a finished voice-over of this storyboard, or None
+    
+    voices.py writes audio_metadata.json last, so it only exists for a voice-over
+    that ran to the end; one older than the storyboard belongs to a previous version.
+    """
+    audio_folder = os.path.join("audio_output", os.path.splitext(os.path.basename(storyboard_path))[0])
+    metadata_path = os.path.join(audio_folder, "audio_metadata.json")
+    try:
+        if os.stat(metadata_path).st_mtime_ns < os.stat(storyboard_path).st_mtime_ns:
+            return None
+        audio_metadata = read_json_file(metadata_path)
+    except (OSError, ValueError):
+        return None
+    return (audio_folder, audio_metadata) if audio_metadata else None
+
+
+
+
+def prefetch_next_storyboard():
+    """Start writing the storyboard of the next pending idea on a worker thread
+    
+    The idea stays pending, with the storyboard recorded as its final_output, so
+    whichever run picks it up next skips the storyboard request. The thread is a
+    daemon, so an interrupted run can exit without waiting for the request.
+    
+    Returns:
+        A future for the prefetch, or None if there's nothing to prefetch
+    """
+    next_idea = next(iter(get_pending_ideas(limit=1)), None)
+    if next_idea is None or saved_storyboard(next_idea):
+        return None
+    
+    prefetch_future = Future()
+    
+    def prefetch():
+        try:
+            storyboard_path = create_storyboard_for_idea(next_idea)
+            ideas_store.update(next_idea['id'], final_output=storyboard_path)
+            log.info(f"\n✓ Prefetched the storyboard of idea {next_idea['id']}: {storyboard_path}")
+        except Exception as e:
+            # Only a head start is lost; the idea's own run generates it again
+            log.warning(f"\n⚠️  Couldn't prefetch the storyboard of idea {next_idea['id']}: {e}")
+        finally:
+            prefetch_future.set_result(None)
+    
+    log.info(f"\n⏩ Writing the storyboard of idea {next_idea['id']} while this video encodes")
+    threading.Thread(target=prefetch, name="storyboard-prefetch", daemon=True).start()
+    return prefetch_future
+
 
 
 
+def find_resumable_idea():
+    """The lowest-ID idea that stopped after its storyboard was saved, or None"""
+    try:
+        candidates = ideas_store.with_status(*RESUMABLE_STATUSES)
+    except FileNotFoundError:
+        return None
+    return next((idea for idea in candidates if saved_storyboard(idea)), None)
+
+
 
-def run_pipeline():
-    """Run the complete video generation pipeline"""
+
+def run_pipeline(pipeline_depth=1, batch_size=1, resume=False):
+    """Run the complete video generation pipeline
+    
+    With pipeline_depth > 1, that many pending ideas are processed with their
+    stages overlapping; with batch_size > 1, that many ideas are processed by
+    separate worker processes. Otherwise only the first pending idea is.
+    With resume, an idea that stopped part-way (see find_resumable_idea) is
+    finished first, reusing the storyboard and voice-over it already has.
+    """
     
     print_header("🎬 AUTOMATED VIDEO GENERATION PIPELINE 🎬")
     
+    # The background video is only needed for the final step, so download it
+    # while the storyboard and voice-over are generated
+    download_future = start_background_download()
+    
     # Step 0: Check required files (excluding ideas.json and background.mp4)
-    if not check_required_files():
-        print("\n❌ Pipeline aborted due to missing files.")
+    if not check_required_files(download_background=False):
+        log.error("\n❌ Pipeline aborted due to missing files.")
         return False
     
+    if resume:
+        idea = find_resumable_idea()
+        if idea is not None:
+            log.info(f"\n↻ Resuming idea ID {idea['id']} (status: {idea['publishing_status']})")
+            return process_idea(idea, download_future, resume=True, prefetch_next=PREFETCH_NEXT_STORYBOARD)
+        log.info("\nNothing to resume, continuing with the next pending idea")
+    
     # ========== Separate check for ideas.json ==========
     print_header("Checking Ideas File")
     
-    # Check if ideas.json exists and has pending ideas
-    if not os.path.exists('ideas.json'):
-        print("⚠️  No 'ideas.json' file found!")
-        print("🎯 Automatically generating new ideas...\n")
+    # Check if ideas.json exists and has pending ideas; reading it tells us
+    # both, without a separate existence check
+    try:
+        idea_id = ideas_store.first_pending()
+        file_found = True
+    except FileNotFoundError:
+        file_found = False
+    except Exception as e:
+        log.error(f"Error reading ideas.json: {e}")
+        idea_id = None
+        file_found = True
+    
+    if not file_found:
+        log.warning("⚠️  No 'ideas.json' file found!")
+        log.info("🎯 Automatically generating new ideas...\n")
         
-        if not generate_new_ideas():
-            print("\n❌ Failed to generate new ideas. Pipeline aborted.")
+        idea_id = generate_new_ideas()
+        if idea_id is None:
+            log.error("\n❌ Failed to generate new ideas. Pipeline aborted.")
             return False
         
-        print("\n✓ New ideas generated successfully! Continuing with pipeline...\n")
-    
-    idea_id = get_current_idea_id()
+        log.info("\n✓ New ideas generated successfully! Continuing with pipeline...\n")
     
     if idea_id is None:
-        print("⚠️  No pending ideas found in ideas.json")
-        print("🎯 All ideas are published or completed. Generating new ideas...\n")
-        
-        if not generate_new_ideas():
-            print("\n❌ Failed to generate new ideas. Pipeline aborted.")
-            return False
-        
-        print("\n✓ New ideas generated successfully! Continuing with pipeline...\n")
-        
-        # Get the first pending idea from newly generated ideas
-        idea_id = get_current_idea_id()
+        log.warning("⚠️  No pending ideas found in ideas.json")
+        log.info("🎯 All ideas are published or completed. Generating new ideas...\n")
         
+        # The first new pending idea comes back directly, without reading the file again
+        idea_id = generate_new_ideas()
         if idea_id is None:
-            print("\n❌ No pending ideas found even after generation. Something went wrong.")
+            log.error("\n❌ Failed to generate new ideas. Pipeline aborted.")
             return False
+        
+        log.info("\n✓ New ideas generated successfully! Continuing with pipeline...\n")
     
-    print(f"✓ Found pending idea ID: {idea_id}")
+    log.info(f"✓ Found pending idea ID: {idea_id}")
     # ====================================================
     
+    if pipeline_depth > 1:
+        return run_pipelined(pipeline_depth, download_future)
+    
+    if batch_size > 1:
+        return run_batch(batch_size, download_future)
+    
+    try:
+        idea = ideas_store.get(idea_id)
+    except Exception as e:
+        log.error(f"Error reading ideas.json: {e}")
+        idea = None
+    if idea is None:
+        log.error(f"\n❌ Idea ID {idea_id} isn't in ideas.json. Pipeline aborted.")
+        return False
+    
+    return process_idea(idea, download_future, prefetch_next=PREFETCH_NEXT_STORYBOARD)
+
+
+
+
+def process_idea(idea, download_future=None, resume=False, prefetch_next=False):
+    """Take one idea through storyboard, voice-over and video, updating its status
+    
+    A storyboard already saved for the idea is reused; with resume, so is a
+    voice-over saved by an earlier attempt. With prefetch_next, the next pending
+    idea's storyboard is written while this idea's video encodes.
+    
+    Returns:
+        True if the video was created
+    """
+    idea_id = idea['id']
     total_steps = 3
-    print(f"\n📋 Processing Idea ID: {idea_id}")
+    prefetch_future = None
+    log.info(f"\n📋 Processing Idea ID: {idea_id}")
     
     try:
         # ====================================================================
@@ -316,58 +1157,68 @@ def run_pipeline():
         # ====================================================================
         print_step(1, total_steps, "Generating Storyboard")
         
-        success = process_first_pending_idea()
-        
-        if not success:
-            print("\n❌ Storyboard generation failed!")
-            update_idea_status(idea_id, "error", error_log="Storyboard generation failed")
-            return False
-        
-        print("\n✓ Storyboard generated successfully!")
-        
-        # Find the generated storyboard
-        storyboard_path = find_latest_storyboard()
-        
-        if not storyboard_path:
-            print("\n❌ Could not find generated storyboard!")
-            update_idea_status(idea_id, "error", error_log="Storyboard file not found")
-            return False
-        
-        print(f"✓ Storyboard location: {storyboard_path}")
+        storyboard_path = saved_storyboard(idea)
+        if storyboard_path:
+            log.info(f"✓ Reusing storyboard: {storyboard_path}")
+        else:
+            try:
+                storyboard_path = create_storyboard_for_idea(idea)
+            except Exception as e:
+                log.error(f"\n❌ Storyboard generation failed: {e}")
+                update_idea_status(idea_id, "error", error_log=f"Storyboard generation failed: {e}")
+                return False
+            
+            log.info("\n✓ Storyboard generated successfully!")
+            log.info(f"✓ Storyboard location: {storyboard_path}")
+        update_idea_status(idea_id, "storyboard_generated", final_output=storyboard_path)
         
         # ====================================================================
         # STEP 2: Generate Voice-Over
         # ====================================================================
         print_step(2, total_steps, "Generating Voice-Over")
         
-        audio_folder, audio_metadata = process_storyboard_audio(storyboard_path)
+        saved_audio = saved_voice_over(storyboard_path) if resume else None
+        if saved_audio:
+            log.info(f"✓ Reusing voice-over: {saved_audio[0]}")
+            audio_folder, audio_metadata = saved_audio
+        else:
+            audio_folder, audio_metadata = process_storyboard_audio(storyboard_path)
         
         if not audio_folder or not audio_metadata:
-            print("\n❌ Voice-over generation failed!")
+            log.error("\n❌ Voice-over generation failed!")
             update_idea_status(idea_id, "error", error_log="Voice-over generation failed")
             return False
         
-        print(f"\n✓ Voice-over generated successfully!")
-        print(f"✓ Audio files location: {audio_folder}")
-        print(f"✓ Total audio clips: {len(audio_metadata)}")
+        log.info(f"\n✓ Voice-over generated successfully!")
+        log.info(f"✓ Audio files location: {audio_folder}")
+        log.info(f"✓ Total audio clips: {len(audio_metadata)}")
         
-        # Update status
-        update_idea_status(idea_id, "audio_generated")
+        # No status write here: "storyboard_generated" already took the idea off
+        # the pending list, and the next write is the terminal one
         
         # ====================================================================
         # STEP 3: Create Final Video
         # ====================================================================
         print_step(3, total_steps, "Creating Final Video")
         
-        video_path = create_video_with_audio(audio_folder)
+        if not wait_for_background_video(download_future):
+            log.error("\n❌ Background video is missing and could not be downloaded!")
+            update_idea_status(idea_id, "error", error_log="Background video download failed")
+            return False
+        
+        # The encoder doesn't use the API, so the next storyboard request can run meanwhile
+        if prefetch_next:
+            prefetch_future = prefetch_next_storyboard()
+        
+        video_path = create_video_with_audio(audio_folder, **FFMPEG_ENCODE_OPTIONS)
         
         if not video_path or not os.path.exists(video_path):
-            print("\n❌ Video creation failed!")
+            log.error("\n❌ Video creation failed!")
             update_idea_status(idea_id, "error", error_log="Video creation failed")
             return False
         
-        print(f"\n✓ Video created successfully!")
-        print(f"✓ Video location: {video_path}")
+        log.info(f"\n✓ Video created successfully!")
+        log.info(f"✓ Video location: {video_path}")
         
         # Update final status
         update_idea_status(idea_id, "completed", final_output=video_path)
@@ -377,106 +1228,391 @@ def run_pipeline():
         # ====================================================================
         print_header("✨ PIPELINE COMPLETED SUCCESSFULLY ✨")
         
-        print("Summary:")
-        print(f"  • Idea ID: {idea_id}")
-        print(f"  • Storyboard: {storyboard_path}")
-        print(f"  • Audio Folder: {audio_folder}")
-        print(f"  • Final Video: {video_path}")
-        print(f"\n🎉 Your video is ready!")
+        log.info("Summary:")
+        log.info(f"  • Idea ID: {idea_id}")
+        log.info(f"  • Storyboard: {storyboard_path}")
+        log.info(f"  • Audio Folder: {audio_folder}")
+        log.info(f"  • Final Video: {video_path}")
+        log.info(f"\n🎉 Your video is ready!")
         
         return True
         
     except KeyboardInterrupt:
-        print("\n\n⚠️  Pipeline interrupted by user")
+        log.warning("\n\n⚠️  Pipeline interrupted by user")
         update_idea_status(idea_id, "error", error_log="Pipeline interrupted by user")
+        # Don't hold the user up for the prefetch; the next run regenerates it if needed
+        prefetch_future = None
         return False
         
     except Exception as e:
-        print(f"\n\n❌ Pipeline failed with error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"\n\n❌ Pipeline failed with error: {str(e)}")
         update_idea_status(idea_id, "error", error_log=f"Pipeline error: {str(e)}")
         return False
+    
+    finally:
+        if prefetch_future is not None:
+            # Let the prefetched storyboard and its status land before returning
+            prefetch_future.result()
+
+
+
+
+def _init_batch_worker(worker_count):
+    """Split the CPU cores between the batch's concurrent ffmpeg encodes"""
+    FFMPEG_ENCODE_OPTIONS["ffmpeg_threads"] = max(1, (os.cpu_count() or 1) // worker_count)
+
+
+
+
+def _process_batch_idea(idea):
+    """process_idea() in a batch worker, whose buffered log records must be written before it exits"""
+    try:
+        return process_idea(idea)
+    finally:
+        flush_log()
+
+
+
+
+def run_batch(batch_size, download_future=None):
+    """Process up to batch_size pending ideas at once, one worker process per idea
+    
+    The ideas are claimed (marked "in_progress:<pid>") before the workers start,
+    so a concurrent run never picks the same idea. An idea whose worker dies is
+    marked "error"; claims left by a run that was killed are released by the next one.
+    
+    Returns:
+        True if every idea produced a video
+    """
+    if not ideas_store.has_file_lock():
+        log.warning("⚠️  Install filelock so the workers' status updates can't overwrite each other")
+    
+    # Workers are separate processes and can't share the download thread
+    if not wait_for_background_video(download_future):
+        log.error("\n❌ Background video is missing and could not be downloaded!")
+        return False
+    
+    ideas = ideas_store.claim_pending(batch_size, owner=f"in_progress:{os.getpid()}")
+    if not ideas:
+        log.warning("⚠️  No pending ideas left to claim; another run may have taken them")
+        return False
+    log.info(f"\n📋 Processing {len(ideas)} ideas in parallel: {', '.join(str(idea['id']) for idea in ideas)}")
+    
+    # Import the stages once here rather than in every worker
+    for name in ("story", "voices", "edit"):
+        _stage_module(name)
+    
+    flush_log()  # Forked workers would otherwise inherit and repeat the buffered records
+    with ProcessPoolExecutor(max_workers=len(ideas), initializer=_init_batch_worker,
+                             initargs=(len(ideas),)) as executor:
+        futures = [executor.submit(_process_batch_idea, idea) for idea in ideas]
+        results = []
+        for idea, future in zip(ideas, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # A worker that crashed or was killed never set a final status; don't leave the claim behind
+                log.error(f"\n❌ Idea {idea['id']}: worker failed: {e}")
+                update_idea_status(idea['id'], "error", error_log=f"Batch worker failed: {e}")
+                results.append(False)
+    
+    print_header("✨ BATCH FINISHED ✨")
+    log.info("Summary:")
+    for idea, success in zip(ideas, results):
+        log.info(f"  {'✓' if success else '✗'} Idea {idea['id']}")
+    
+    return all(results)
+
+
+
+
+def run_pipelined(pipeline_depth, download_future=None):
+    """Take up to pipeline_depth pending ideas through all three stages, overlapping them
+    
+    Each stage runs in its own thread and hands ideas to the next through a queue,
+    so one idea's voice-over is generated while the next idea's storyboard is, and
+    its video is rendered while the one after that is voiced. Storyboards are
+    requested on PIPELINE_STORYBOARD_WORKERS threads and voice-overs run on
+    PIPELINE_TTS_WORKERS threads; the encoder gets the machine to itself. The video
+    stage first waits for download_future, if the background video is still downloading.
+    
+    Returns:
+        True if every idea produced a video
+    """
+    ideas = get_pending_ideas(limit=pipeline_depth)
+    log.info(f"\n📋 Processing {len(ideas)} ideas: {', '.join(str(idea['id']) for idea in ideas)}")
+    
+    idea_queue = queue.Queue()
+    for idea in ideas:
+        idea_queue.put(idea)
+    audio_queue = queue.Queue()
+    video_queue = queue.Queue()
+    videos = {}
+    
+    def fail(idea_id, message):
+        log.error(f"\n❌ Idea {idea_id}: {message}")
+        update_idea_status(idea_id, "error", error_log=message)
+    
+    def storyboard_stage():
+        while True:
+            try:
+                idea = idea_queue.get_nowait()
+            except queue.Empty:
+                break
+            log.info(f"\n[STORYBOARD] Idea {idea['id']}: {idea['idea']}")
+            flush_log()
+            try:
+                storyboard_path = saved_storyboard(idea) or create_storyboard_for_idea(idea)
+            except Exception as e:
+                fail(idea['id'], f"Storyboard generation failed: {e}")
+                continue
+            update_idea_status(idea['id'], "storyboard_generated", final_output=storyboard_path)
+            audio_queue.put((idea['id'], storyboard_path))
+    
+    def audio_stage():
+        while True:
+            job = audio_queue.get()
+            if job is None:
+                break
+            idea_id, storyboard_path = job
+            log.info(f"\n[VOICE-OVER] Idea {idea_id}: {storyboard_path}")
+            flush_log()
+            try:
+                audio_folder, audio_metadata = process_storyboard_audio(storyboard_path)
+            except Exception as e:
+                fail(idea_id, f"Voice-over generation failed: {e}")
+                continue
+            if not audio_folder or not audio_metadata:
+                fail(idea_id, "Voice-over generation failed")
+                continue
+            video_queue.put((idea_id, audio_folder))
+    
+    def video_stage():
+        while True:
+            job = video_queue.get()
+            if job is None:
+                break
+            idea_id, audio_folder = job
+            if not wait_for_background_video(download_future):
+                fail(idea_id, "Background video download failed")
+                continue
+            log.info(f"\n[VIDEO] Idea {idea_id}: {audio_folder}")
+            flush_log()
+            try:
+                video_path = create_video_with_audio(audio_folder, **FFMPEG_ENCODE_OPTIONS)
+            except Exception as e:
+                fail(idea_id, f"Video creation failed: {e}")
+                continue
+            if not video_path or not os.path.exists(video_path):
+                fail(idea_id, "Video creation failed")
+                continue
+            update_idea_status(idea_id, "completed", final_output=video_path)
+            videos[idea_id] = video_path
+    
+    storyboard_workers = [
+        threading.Thread(target=storyboard_stage, name=f"storyboard-{n}", daemon=True)
+        for n in range(min(PIPELINE_STORYBOARD_WORKERS, len(ideas)) or 1)
+    ]
+    voice_workers = [
+        threading.Thread(target=audio_stage, name=f"voice-over-{n}", daemon=True)
+        for n in range(PIPELINE_TTS_WORKERS)
+    ]
+    encoder = threading.Thread(target=video_stage, name="video", daemon=True)
+    for worker in storyboard_workers + voice_workers + [encoder]:
+        worker.start()
+    
+    # Each stage stops once every worker of the stage before it is done
+    for worker in storyboard_workers:
+        worker.join()
+    for _ in voice_workers:
+        audio_queue.put(None)
+    for worker in voice_workers:
+        worker.join()
+    video_queue.put(None)
+    encoder.join()
+    
+    print_header("✨ PIPELINE FINISHED ✨")
+    log.info("Summary:")
+    for idea in ideas:
+        video_path = videos.get(idea['id'])
+        log.info(f"  {'✓' if video_path else '✗'} Idea {idea['id']}: {video_path or 'failed'}")
+    
+    return len(videos) == len(ideas)
+
+
+
+
+# Rendered once; the menu is shown again after every action
+MENU_TEXT = HEADER_TEMPLATE.format("🎬 VIDEO GENERATION PIPELINE 🎬") + "\n" + "\n".join([
+    "Options:",
+    "  1. Run full pipeline (idea → storyboard → audio → video)",
+    "  2. Generate storyboard only",
+    "  3. Generate audio from latest storyboard",
+    "  4. Create video from latest audio",
+    "  5. Check system status",
+    "  6. Generate new ideas",
+    "  7. Exit",
+    "",
+])
 
 
 
 
 def show_menu():
     """Show interactive menu"""
-    print_header("🎬 VIDEO GENERATION PIPELINE 🎬")
-    
-    print("Options:")
-    print("  1. Run full pipeline (idea → storyboard → audio → video)")
-    print("  2. Generate storyboard only")
-    print("  3. Generate audio from latest storyboard")
-    print("  4. Create video from latest audio")
-    print("  5. Check system status")
-    print("  6. Generate new ideas")
-    print("  7. Exit")
-    print()
-    
-    choice = input("Enter your choice (1-7): ").strip()
+    log.info(MENU_TEXT)
+    
+    choice = prompt("Enter your choice (1-7): ").strip()
     return choice
 
 
 
 
+def menu_storyboard():
+    """Menu option 2: generate the storyboard for the first pending idea"""
+    print_step(1, 1, "Generating Storyboard")
+    ideas_store.compact()
+    if process_first_pending_idea():
+        log.info("\n✓ Storyboard generated!")
+    else:
+        log.error("\n❌ Storyboard generation failed!")
+
+
+
+
+def menu_audio():
+    """Menu option 3: voice the latest storyboard"""
+    print_step(1, 1, "Generating Audio")
+    storyboard_path = find_latest_storyboard()
+    if storyboard_path:
+        audio_folder, _ = process_storyboard_audio(storyboard_path)
+        log.info(f"\n✓ Audio generated: {audio_folder}")
+    else:
+        log.error("\n❌ No storyboard found!")
+
+
+
+
+def menu_video():
+    """Menu option 4: render the latest audio folder"""
+    print_step(1, 1, "Creating Video")
+    audio_folder = find_latest_audio_folder()
+    if audio_folder:
+        video_path = create_video_with_audio(audio_folder, **FFMPEG_ENCODE_OPTIONS)
+        log.info(f"\n✓ Video created: {video_path}")
+    else:
+        log.error("\n❌ No audio folder found!")
+
+
+
+
+def menu_check():
+    """Menu option 5: check the required files again"""
+    invalidate_asset_cache()
+    check_required_files(force=True)
+
+
+
+
+def menu_generate_ideas():
+    """Menu option 6: generate new ideas"""
+    if generate_new_ideas() is not None:
+        log.info("\n✓ New ideas generated successfully!")
+    else:
+        log.error("\n❌ Failed to generate new ideas!")
+
+
+
+
+# Menu choices and their actions; "7" exits the loop
+MENU_ACTIONS = {
+    "1": run_pipeline,
+    "2": menu_storyboard,
+    "3": menu_audio,
+    "4": menu_video,
+    "5": menu_check,
+    "6": menu_generate_ideas,
+}
+
+
+
+
 def run_interactive():
     """Run in interactive mode"""
     while True:
         choice = show_menu()
         
-        if choice == "1":
-            run_pipeline()
-            input("\nPress Enter to continue...")
-            
-        elif choice == "2":
-            print_step(1, 1, "Generating Storyboard")
-            success = process_first_pending_idea()
-            if success:
-                print("\n✓ Storyboard generated!")
-            else:
-                print("\n❌ Storyboard generation failed!")
-            input("\nPress Enter to continue...")
-            
-        elif choice == "3":
-            print_step(1, 1, "Generating Audio")
-            storyboard_path = find_latest_storyboard()
-            if storyboard_path:
-                audio_folder, _ = process_storyboard_audio(storyboard_path)
-                print(f"\n✓ Audio generated: {audio_folder}")
-            else:
-                print("\n❌ No storyboard found!")
-            input("\nPress Enter to continue...")
-            
-        elif choice == "4":
-            print_step(1, 1, "Creating Video")
-            audio_folder = find_latest_audio_folder()
-            if audio_folder:
-                video_path = create_video_with_audio(audio_folder)
-                print(f"\n✓ Video created: {video_path}")
-            else:
-                print("\n❌ No audio folder found!")
-            input("\nPress Enter to continue...")
-            
-        elif choice == "5":
-            check_required_files()
-            input("\nPress Enter to continue...")
-            
-        elif choice == "6":
-            if generate_new_ideas():
-                print("\n✓ New ideas generated successfully!")
-            else:
-                print("\n❌ Failed to generate new ideas!")
-            input("\nPress Enter to continue...")
-            
-        elif choice == "7":
-            print("\nGoodbye! 👋")
+        if choice == "7":
+            log.info("\nGoodbye! 👋")
             break
-            
+        
+        action = MENU_ACTIONS.get(choice)
+        if action is None:
+            log.warning("\n⚠️  Invalid choice. Please try again.")
         else:
-            print("\n⚠️  Invalid choice. Please try again.")
-            input("\nPress Enter to continue...")
+            action()
+        prompt("\nPress Enter to continue...")
+
+
+
+
+def cli_run():
+    """--run: run the full pipeline, optionally on several ideas at once"""
+    counts = {"--pipeline-depth": 1, "--batch": 1}
+    for flag in counts:
+        if flag in sys.argv:
+            try:
+                counts[flag] = max(1, int(sys.argv[sys.argv.index(flag) + 1]))
+            except (IndexError, ValueError):
+                log.info(f"{flag} needs a number of ideas")
+                return 1
+    success = run_pipeline(counts["--pipeline-depth"], counts["--batch"], resume="--resume" in sys.argv)
+    return 0 if success else 1
+
+
+
+
+def cli_check():
+    """--check: check system status"""
+    invalidate_asset_cache()
+    check_required_files(force=True)
+    return 0
+
+
+
+
+def cli_generate_ideas():
+    """--generate-ideas: generate new ideas"""
+    return 0 if generate_new_ideas() is not None else 1
+
+
+
+
+def cli_help():
+    """--help: show usage"""
+    log.info("\nUsage:")
+    log.info("  python main.py                   # Interactive mode")
+    log.info("  python main.py --run             # Run full pipeline")
+    log.info("  python main.py --run --pipeline-depth N")
+    log.info("                                   # Run up to N pending ideas with stages overlapped")
+    log.info("  python main.py --run --batch N   # Run up to N pending ideas in parallel processes")
+    log.info("  python main.py --run --resume    # First finish an idea that stopped part-way")
+    log.info("  python main.py --check           # Check system status")
+    log.info("  python main.py --generate-ideas  # Generate new ideas")
+    log.info("  python main.py --help            # Show this help")
+    log.info("")
+    return 0
+
+
+
+
+# Command-line options and the functions that handle them; each returns the exit code
+CLI_COMMANDS = {
+    "--run": cli_run, "-r": cli_run,
+    "--check": cli_check, "-c": cli_check,
+    "--generate-ideas": cli_generate_ideas, "-g": cli_generate_ideas,
+    "--help": cli_help, "-h": cli_help,
+}
 
 
 
@@ -485,40 +1621,16 @@ if __name__ == "__main__":
     # Check command line arguments
     if len(sys.argv) > 1:
         arg = sys.argv[1].lower()
-        
-        if arg == "--run" or arg == "-r":
-            # Run full pipeline automatically
-            success = run_pipeline()
-            sys.exit(0 if success else 1)
-            
-        elif arg == "--check" or arg == "-c":
-            # Check system status
-            check_required_files()
-            sys.exit(0)
-            
-        elif arg == "--generate-ideas" or arg == "-g":
-            # Generate new ideas
-            success = generate_new_ideas()
-            sys.exit(0 if success else 1)
-            
-        elif arg == "--help" or arg == "-h":
-            # Show help
-            print("\nUsage:")
-            print("  python main.py                   # Interactive mode")
-            print("  python main.py --run             # Run full pipeline")
-            print("  python main.py --check           # Check system status")
-            print("  python main.py --generate-ideas  # Generate new ideas")
-            print("  python main.py --help            # Show this help")
-            print()
-            sys.exit(0)
-        else:
-            print(f"Unknown argument: {arg}")
-            print("Use --help to see available options")
+        command = CLI_COMMANDS.get(arg)
+        if command is None:
+            log.info(f"Unknown argument: {arg}")
+            log.info("Use --help to see available options")
             sys.exit(1)
+        sys.exit(command())
     else:
         # Run in interactive mode
         try:
             run_interactive()
         except KeyboardInterrupt:
-            print("\n\nGoodbye! 👋")
+            log.info("\n\nGoodbye! 👋")
             sys.exit(0)
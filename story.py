@@ -1,26 +1,37 @@
 import os
 import json
+import heapq
 import re
+from contextlib import nullcontext
 from dotenv import load_dotenv
+from ideas import (
+    read_json_file, write_json_file, loads_json, checkpoint_path, save_checkpoint, shared_http_client,
+    journal_path_for, append_journal_entry, replay_journal, ideas_file_lock
+)
 
 
 # Load environment variables
 load_dotenv()
 
 
-def initialize_client():
-    """Initializes the appropriate client based on the .env configuration."""
-    api_provider = os.getenv("API_PROVIDER", "OPENAI").upper()
+# Reuse the storyboard saved for an identical request instead of asking the API again
+STORYBOARD_CACHE = os.getenv("STORYBOARD_CACHE", "no").lower() == "yes"
 
+API_PROVIDER = os.getenv("API_PROVIDER", "OPENAI").upper()
+IS_NVIDIA = API_PROVIDER == "NVIDIA"
 
-    if api_provider == "NVIDIA":
+
+def initialize_client():
+    """Initializes the appropriate client based on the .env configuration."""
+    if IS_NVIDIA:
         from openai import OpenAI
         print("Using NVIDIA NIM API")
         return OpenAI(
             base_url="https://integrate.api.nvidia.com/v1",
-            api_key=os.getenv("NVIDIA_API_KEY")
+            api_key=os.getenv("NVIDIA_API_KEY"),
+            http_client=shared_http_client()
         )
-    elif api_provider == "G4F":
+    elif API_PROVIDER == "G4F":
         import g4f
         print("Using G4F API")
         return g4f.client.Client()
@@ -29,7 +40,8 @@ def initialize_client():
         print("Using OpenAI API")
         return OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_BASE_URL")
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            http_client=shared_http_client()
         )
 
 
@@ -37,110 +49,186 @@ client = initialize_client()
 
 
 def load_ideas(file_path="ideas.json"):
-    """Load ideas from JSON file"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load ideas from JSON file (orjson-backed when installed), with journaled status updates applied"""
+    ideas = read_json_file(file_path)
+    replay_journal(journal_path_for(file_path), {idea['id']: idea for idea in ideas})
+    return ideas
 
 
 def save_ideas(ideas, file_path="ideas.json"):
-    """Save updated ideas back to JSON file"""
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(ideas, f, indent=2, ensure_ascii=False)
+    """Fold the journal into the JSON file (orjson-backed when installed) and refresh ideas from it
+    
+    The file is read again and the journal replayed under the ideas file lock, so
+    updates another process journaled (main.py's stages) aren't lost; changes to
+    ideas must have been recorded with journal_idea.
+    """
+    with ideas_file_lock(file_path) or nullcontext():
+        current = load_ideas(file_path)
+        write_json_file(file_path, current)
+        try:
+            os.remove(journal_path_for(file_path))
+        except FileNotFoundError:
+            pass
+    ideas[:] = current
+
+
+def journal_idea(idea, fields, file_path="ideas.json"):
+    """Apply a status change to an idea and journal it, so it survives a crash before save_ideas"""
+    idea.update(fields)
+    # Under the lock, so a concurrent compaction can't remove the journal between its read and this line
+    with ideas_file_lock(file_path) or nullcontext():
+        append_journal_entry(journal_path_for(file_path), idea['id'], fields)
+
+
+FENCED_JSON = re.compile(r'```(?:json)?\s*(\[[\s\S]*?\]|\{[\s\S]*?\})\s*```')
 
 
 def extract_json_from_response(response_text):
     """Extract JSON from response that might be wrapped in markdown or have extra text"""
-    try:
-        return json.loads(response_text)
-    except json.JSONDecodeError:
-        pass
-    
-    json_match = re.search(r'``````', response_text)
-    if json_match:
+    stripped = response_text.lstrip()
+    if stripped.startswith(('[', '{')):
+        # Bare JSON, possibly followed by stray tokens: no pattern matching needed
         try:
-            return json.loads(json_match.group(1))
+            return json.JSONDecoder().raw_decode(stripped)[0]
         except json.JSONDecodeError:
             pass
-            
-    array_match = re.search(r'(\[[\s\S]*?\])', response_text)
-    if array_match:
+    else:
         try:
-            return json.loads(array_match.group(1))
+            return loads_json(response_text)
+        except json.JSONDecodeError:
+            pass
+    
+    json_match = FENCED_JSON.search(response_text)
+    if json_match:
+        try:
+            return loads_json(json_match.group(1))
         except json.JSONDecodeError:
             pass
             
+    array_text = find_json_array(response_text)
+    if array_text:
+        return loads_json(array_text)
+            
     raise ValueError(f"Could not extract valid JSON from response. Response content:\n{response_text[:500]}")
 
 
-def generate_storyboard(idea_title, idea_description, caption):
-    """Generate storyboard using the configured API"""
-    api_provider = os.getenv("API_PROVIDER", "OPENAI").upper()
+class JsonArrayScanner:
+    """Finds complete top-level JSON arrays in text that arrives piece by piece
     
-    system_prompt = """You are a dialogue-first content generator for short-form videos on any topic.
-
-
-The user will provide:
-- video_title (string)
-- video_description (string)
-- Optional: genre_tone (string), target_audience (string), language (string), pacing (string)
-
-
-Your task:
-Create a structured, dialogue-only storyboard in JSON array format for 5-8 sequential scenes that tell a single, coherent story. Lines must alternate strictly between "Person 1" and "Person 2".
-
-
-**CRITICAL: Your primary goal is to create a logical NARRATIVE FLOW. Each scene must directly and logically follow from the one before it. Do not jump between unrelated examples. Build a single, focused story from start to finish.**
-
-
-Narration style:
-- Spoken dialogue only—no stage directions, camera notes, or other text.
-- Use a dynamic storytelling rhythm. Person 1 is the storyteller, revealing facts. Person 2 is the audience proxy, asking logical follow-up questions ("But how does that work?", "So what happened next?", "Why does that matter?") that guide the story forward.
-- **Focus on a single narrative thread.** For example, if the topic is quantum tunneling, don't just list where it's used. Instead, explain the concept, then how it solves a specific problem (like fusion in the sun), and then how that same solution is used elsewhere (like in computer chips).
-- Keep each line concise and punchy (5–12 words).
-- Use only simple, common words. Explain any complex term immediately.
+    A single pass with bracket depth and string/escape state, so brackets inside
+    strings are ignored and nested arrays stay part of their outer array.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.array_start = None
+    
+    def feed(self, content):
+        """Scan more text, yielding (text, value) for every top-level array it completes that parses"""
+        scanned = len(self.text)
+        self.text += content
+        text = self.text
+        
+        for i in range(scanned, len(text)):
+            char = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth > 0:
+                self.in_string = True
+            elif char in '[{':
+                if self.depth == 0 and char == '[':
+                    self.array_start = i
+                self.depth += 1
+            elif char in ']}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0 and self.array_start is not None:
+                    candidate = text[self.array_start:i + 1]
+                    self.array_start = None
+                    try:
+                        yield candidate, loads_json(candidate)
+                    except json.JSONDecodeError:
+                        pass  # A bracketed aside in prose
+
+
+def find_json_array(text):
+    """The outermost JSON array in text, preferring the longest when the model adds inline examples"""
+    candidates = [candidate for candidate, _ in JsonArrayScanner().feed(text)]
+    return max(candidates, key=len) if candidates else None
+
+
+def read_streamed_json(response):
+    """Collect a streamed completion, stopping as soon as its array of scenes (or ideas) is complete
+    
+    Returns that array's own text, which leaves out any markdown or trailing
+    tokens the model adds around it; otherwise the full response.
+    """
+    scanner = JsonArrayScanner()
+    
+    try:
+        for chunk in response:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if not content:
+                continue
+            for candidate, value in scanner.feed(content):
+                # Inline examples like [1, 2] don't end the stream; the payload is a list of objects
+                if value and isinstance(value[0], dict):
+                    return candidate
+    finally:
+        response.close()
+    
+    return scanner.text
 
 
-New Narrative Structure (5-8 Scenes):
-1.  Scene 1 = **The Hook.** Introduce the core, mind-bending concept or event.
-2.  Scenes 2-3 = **The Unfolding.** Explain the "how" or "why" of the hook. Reveal the immediate consequence or problem this creates.
-3.  Scenes 4-6 = **The Escalation.** Introduce a surprising twist or a powerful application that builds on the previous scenes. Show the incredible scale or impact.
-4.  Scene 7-8 = **The Final Reveal.** A final, powerful connection that brings the story to a satisfying close, often linking back to the viewer's everyday life.
+STORYBOARD_SYSTEM_PROMPT = """You write dialogue-only storyboards for short-form videos on any topic. The user gives video_title, video_description and optionally genre_tone, target_audience, language and pacing.
 
+Write 5-8 scenes that tell ONE coherent story: each scene follows logically from the previous one and its dialogue bridges into the next. No lists of unrelated facts or examples, no generic lessons or morals.
 
-Continuity and Flow Rules:
--   **Chain of Logic:** The end of one scene must be the natural starting point for the next. The dialogue must explicitly bridge the two scenes.
--   **One Story:** Do not treat this as a list of facts. Treat it as a short story with a beginning, middle, and end.
--   **Logical Questions:** Person 2's lines are crucial for flow. They should ask the question the audience is thinking, leading Person 1 to the next part of the story.
+Rules:
+- Person 1 is the storyteller revealing facts; Person 2 is the audience proxy, asking the follow-up question the viewer is thinking ("But how does that work?", "So what happened next?") to lead into the next step.
+- Spoken lines only: no stage directions or camera notes. 5-12 words per line, simple common words, explain any complex term immediately.
+- Structure: scene 1 hooks with the core concept or event; scenes 2-3 explain how/why and its consequence; scenes 4-6 escalate with a twist or powerful application; the last 1-2 scenes give a final reveal, often tied to everyday life.
+- Each scene: scene_id (1-8), topic_focus (short phrase for this story step), audio_style (delivery mood such as suspenseful, shocking, dramatic, epic; varies between scenes), dialogue_lines (2 exchanges strictly alternating, starting with Person 1).
+- Use the user's language.
 
+Return ONLY a JSON array of scene objects, no explanations or headers:
+[{"scene_id":1,"topic_focus":"...","audio_style":"...","dialogue_lines":[{"speaker":"Person 1","line":"..."},{"speaker":"Person 2","line":"..."}]}]
+"""
 
-Each scene must include:
--   scene_id: integer (1 to 8 maximum)
--   topic_focus: A short phrase describing this specific step in the story.
--   audio_style: A mood for the delivery (e.g., suspenseful, shocking, intense, dramatic, epic). Must vary between scenes.
--   dialogue_lines: An array of 2 exchanges that strictly alternate, starting with Person 1.
-    -   Each exchange has:
-        -   speaker: "Person 1" or "Person 2"
-        -   line: The spoken line (simple, punchy, and contributes to the narrative).
 
+# Appended to the system prompt when several ideas share one request
+BATCH_STORYBOARD_INSTRUCTIONS = """
 
-Content Quality Checklist:
--   Does the script tell one single, focused story?
--   Does each scene logically connect to the previous one?
--   Is there a clear beginning (hook), middle (escalation), and end (reveal)?
--   Are Person 2's questions guiding the narrative logically?
--   Are all generic "lesson" or "moral" dialogues removed?
+Batch mode:
+- The user message is a JSON array of videos, each with id, video_title, video_description and caption.
+- Write a separate storyboard for every video, following all of the rules above.
+- Return ONLY a JSON array with one object per video, in the input order: {"id": <the video's id>, "storyboard": [<5-8 scene objects>]}
+"""
 
 
-Language:
--   Mirror the user's input language. Prioritize simple vocabulary.
+def get_model_name(api_provider):
+    """Model configured for the given API provider"""
+    if api_provider == "NVIDIA":
+        return os.getenv("NVIDIA_MODEL", "meta/llama3-70b-instruct")
+    elif api_provider == "G4F":
+        return os.getenv("G4F_MODEL", "gpt-4")
+    else: # OpenAI
+        return os.getenv("OPENAI_MODEL", "gpt-4")
 
 
-Output format:
--   Return ONLY a JSON array of 5-8 scene objects. No explanations or headers.
-"""
+MODEL_NAME = get_model_name(API_PROVIDER)
 
 
-    user_prompt = f"""video_title: {idea_title}
+def storyboard_user_prompt(idea_title, idea_description, caption):
+    """User message of a single-idea storyboard request"""
+    return f"""video_title: {idea_title}
 video_description: {idea_description}
 caption: {caption}
 genre_tone: educational, fast-paced
@@ -149,30 +237,56 @@ language: English
 pacing: fast"""
 
 
+def storyboard_cache_path(idea_title, idea_description, caption):
+    """Cache file of a single-idea storyboard, keyed by a hash of everything sent to the API"""
+    return checkpoint_path(
+        'storyboard', API_PROVIDER, MODEL_NAME, STORYBOARD_SYSTEM_PROMPT,
+        storyboard_user_prompt(idea_title, idea_description, caption)
+    )
+
+
+def load_cached_storyboard(idea_title, idea_description, caption):
+    """The cached storyboard for this request, or None (always None unless STORYBOARD_CACHE is on)"""
+    if not STORYBOARD_CACHE:
+        return None
     try:
-        if api_provider == "NVIDIA":
-            model = os.getenv("NVIDIA_MODEL", "meta/llama3-70b-instruct")
-        elif api_provider == "G4F":
-            model = os.getenv("G4F_MODEL", "gpt-4")
-        else: # OpenAI
-            model = os.getenv("OPENAI_MODEL", "gpt-4")
+        return read_json_file(storyboard_cache_path(idea_title, idea_description, caption))
+    except (OSError, ValueError):
+        return None
+
 
+def cache_storyboard(idea_title, idea_description, caption, storyboard):
+    """Remember a generated storyboard when STORYBOARD_CACHE is on"""
+    if STORYBOARD_CACHE:
+        save_checkpoint(storyboard_cache_path(idea_title, idea_description, caption), storyboard)
 
+
+def generate_storyboard(idea_title, idea_description, caption):
+    """Generate storyboard using the configured API"""
+    cached = load_cached_storyboard(idea_title, idea_description, caption)
+    if cached is not None:
+        print("✓ Using cached storyboard")
+        return cached
+    
+    user_prompt = storyboard_user_prompt(idea_title, idea_description, caption)
+    
+    try:
         response = client.chat.completions.create(
-            model=model,
+            model=MODEL_NAME,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": STORYBOARD_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.7
+            temperature=0.7,
+            stream=True
         )
         
-        storyboard_text = response.choices[0].message.content
+        storyboard_text = read_streamed_json(response)
         
         # For NVIDIA provider, parse JSON directly without extraction logic
-        if api_provider == "NVIDIA":
+        if IS_NVIDIA:
             try:
-                storyboard = json.loads(storyboard_text)
+                storyboard = loads_json(storyboard_text)
                 print("✓ NVIDIA: Using raw JSON output directly")
             except json.JSONDecodeError as e:
                 raise Exception(f"NVIDIA API returned invalid JSON: {str(e)}\nResponse: {storyboard_text[:500]}")
@@ -180,74 +294,180 @@ pacing: fast"""
             # For other providers, use the extraction logic
             storyboard = extract_json_from_response(storyboard_text)
         
+        cache_storyboard(idea_title, idea_description, caption, storyboard)
         return storyboard
     
     except Exception as e:
         raise Exception(f"Error generating storyboard: {str(e)}")
 
 
+def parse_storyboard_batch(response_text):
+    """Map idea ID -> storyboard from a batch response, which may be wrapped in markdown or other text"""
+    try:
+        data = loads_json(response_text)
+    except json.JSONDecodeError:
+        # The longest complete top-level array, as find_json_array picks it, already parsed by the scanner
+        candidates = list(JsonArrayScanner().feed(response_text))
+        if not candidates:
+            raise ValueError(f"No JSON array in batch response:\n{response_text[:500]}")
+        data = max(candidates, key=lambda candidate: len(candidate[0]))[1]
+    
+    if isinstance(data, dict):
+        # Some models wrap the array in an object
+        data = next((value for value in data.values() if isinstance(value, list)), [])
+    
+    return {
+        item['id']: item['storyboard'] for item in data
+        if isinstance(item, dict) and isinstance(item.get('storyboard'), list)
+    }
+
+
+def generate_storyboards(ideas):
+    """Generate the storyboards of several ideas with a single request
+    
+    Args:
+        ideas: Idea dicts with id, idea and caption
+    
+    Returns:
+        dict: Idea ID -> storyboard, for every idea the response covered
+    """
+    videos = [
+        {"id": idea['id'], "video_title": idea['idea'], "video_description": idea['caption'], "caption": idea['caption']}
+        for idea in ideas
+    ]
+    user_prompt = f"""videos: {json.dumps(videos, ensure_ascii=False)}
+genre_tone: educational, fast-paced
+target_audience: general audience
+language: English
+pacing: fast"""
+    
+    try:
+        response = client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[
+                {"role": "system", "content": STORYBOARD_SYSTEM_PROMPT + BATCH_STORYBOARD_INSTRUCTIONS},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.7,
+            stream=True
+        )
+        return parse_storyboard_batch(read_streamed_json(response))
+    
+    except Exception as e:
+        raise Exception(f"Error generating storyboards: {str(e)}")
+
+
 def save_storyboard(storyboard, filename):
     """Save storyboard to a JSON file"""
     os.makedirs("story_board", exist_ok=True)
     file_path = os.path.join("story_board", filename)
     
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(storyboard, f, indent=2, ensure_ascii=False)
+    write_json_file(file_path, storyboard)
         
     return file_path
 
 
-def process_first_pending_idea():
-    """Process only the first idea with smallest ID and pending status"""
+def storyboard_filename(idea):
+    """File name of an idea's storyboard inside story_board/"""
+    return f"{idea['idea'].replace(' ', '_').replace('/', '_')}.json"
+
+
+def create_storyboard_for_idea(idea):
+    """Generate and save the storyboard for an idea, returning the saved path"""
+    storyboard = generate_storyboard(
+        idea_title=idea['idea'],
+        idea_description=idea['caption'],
+        caption=idea['caption']
+    )
+    
+    return save_storyboard(storyboard, storyboard_filename(idea))
+
+
+def process_pending_ideas(batch_size=10):
+    """Generate storyboards for up to batch_size pending ideas, lowest IDs first
+    
+    Several ideas share one request; ideas the batch response leaves out, or all
+    of them if it can't be parsed, get a request of their own.
+    
+    Returns:
+        bool: True if every selected idea got its storyboard
+    """
     ideas = load_ideas()
-    ideas.sort(key=lambda x: x['id'])
     
-    for idea in ideas:
-        if idea.get('publishing_status') != 'pending':
-            print(f"Skipping ID {idea['id']}: Status is '{idea.get('publishing_status')}'")
-            continue
-            
+    # Partial selection of the lowest pending IDs instead of sorting every idea
+    batch = heapq.nsmallest(
+        batch_size,
+        (idea for idea in ideas if idea.get('publishing_status') == 'pending'),
+        key=lambda x: x['id']
+    )
+    
+    if not batch:
+        print("\nNo ideas with 'pending' status found.")
+        print(f"{'='*50}")
+        return False
+    
+    storyboards = {}
+    for idea in batch:
+        cached = load_cached_storyboard(idea['idea'], idea['caption'], idea['caption'])
+        if cached is not None:
+            storyboards[idea['id']] = cached
+    
+    uncached = [idea for idea in batch if idea['id'] not in storyboards]
+    if len(uncached) > 1:
+        print(f"\nGenerating storyboards for {len(uncached)} ideas in one request...")
+        try:
+            generated = generate_storyboards(uncached)
+        except Exception as e:
+            print(f"⚠️  Batch request failed, generating one at a time: {e}")
+            generated = {}
+        for idea in uncached:
+            if idea['id'] in generated:
+                storyboards[idea['id']] = generated[idea['id']]
+                cache_storyboard(idea['idea'], idea['caption'], idea['caption'], generated[idea['id']])
+    
+    failures = 0
+    for idea in batch:
         print(f"\nProcessing ID {idea['id']}: {idea['idea']}")
         
         try:
-            print("Generating storyboard...")
-            storyboard = generate_storyboard(
-                idea_title=idea['idea'],
-                idea_description=idea['caption'],
-                caption=idea['caption']
-            )
-            
-            filename = f"{idea['idea'].replace(' ', '_').replace('/', '_')}.json"
-            saved_path = save_storyboard(storyboard, filename)
+            storyboard = storyboards.get(idea['id'])
+            if storyboard is None:
+                print("Generating storyboard...")
+                storyboard = generate_storyboard(
+                    idea_title=idea['idea'],
+                    idea_description=idea['caption'],
+                    caption=idea['caption']
+                )
+            saved_path = save_storyboard(storyboard, storyboard_filename(idea))
             
-            idea['final_output'] = saved_path
-            idea['publishing_status'] = 'storyboard_generated'
-            idea['error_log'] = ''
-            
-            save_ideas(ideas)
+            journal_idea(idea, {
+                'final_output': saved_path,
+                'publishing_status': 'storyboard_generated',
+                'error_log': ''
+            })
             
             print(f"✓ Storyboard saved: {saved_path}")
             print(f"✓ Status updated to 'storyboard_generated'")
-            print(f"\n{'='*50}")
-            print(f"Processing complete!")
-            print(f"{'='*50}")
-            return True
             
         except Exception as e:
+            failures += 1
             error_message = str(e)
-            idea['error_log'] = error_message
-            save_ideas(ideas)
-            
+            journal_idea(idea, {'error_log': error_message})
             print(f"✗ Error processing ID {idea['id']}: {error_message}")
-            print(f"\n{'='*50}")
-            print(f"Processing failed!")
-            print(f"{'='*50}")
-            return False
-            
-    print("\nNo ideas with 'pending' status found.")
+    
+    # One full write for the whole batch; until then each idea's update is in the journal
+    save_ideas(ideas)
+    
+    print(f"\n{'='*50}")
+    print(f"Processing complete!" if not failures else f"Processing failed for {failures} of {len(batch)} ideas!")
     print(f"{'='*50}")
-    return False
+    return failures == 0
+
+
+def process_first_pending_idea():
+    """Process only the first idea with smallest ID and pending status"""
+    return process_pending_ideas(batch_size=1)
 
 
 if __name__ == "__main__":
-    process_first_pending_idea()
+    process_pending_ideas()
@@ -0,0 +1,29 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import edit
+
+
+class CreateLineImageTest(unittest.TestCase):
+    """Punctuation-only chunks and large fonts used to overflow the padded canvas"""
+
+    def test_glyph_mask_fits_the_canvas(self):
+        for font_size in (edit.SUBTITLE_FONT_SIZE, 65, 120):
+            for text in ("...", ",", "-", "—", "Hello world", "Really?", "jumping quickly"):
+                with self.subTest(text=text, font_size=font_size):
+                    img_array = edit.create_line_image(text, 1080, font_size)
+
+                    self.assertEqual(img_array.ndim, 3)
+                    self.assertEqual(img_array.shape[2], 4)
+                    # Something was drawn, and the outline doesn't touch the canvas edge
+                    alpha = img_array[..., 3]
+                    self.assertTrue(alpha.any())
+                    self.assertFalse(alpha[0].any() or alpha[-1].any())
+                    self.assertFalse(alpha[:, 0].any() or alpha[:, -1].any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ideas
+
+
+class FakeAPIStatusError(Exception):
+    def __init__(self, message, body=None):
+        super().__init__(message)
+        self.body = body
+
+
+class FakeBadRequestError(FakeAPIStatusError):
+    pass
+
+
+class FakeNotFoundError(FakeAPIStatusError):
+    pass
+
+
+class FakeUnprocessableEntityError(FakeAPIStatusError):
+    pass
+
+
+FAKE_OPENAI = types.SimpleNamespace(
+    APIStatusError=FakeAPIStatusError,
+    BadRequestError=FakeBadRequestError,
+    NotFoundError=FakeNotFoundError,
+    UnprocessableEntityError=FakeUnprocessableEntityError,
+)
+
+
+class ResponseFormatRejectedTest(unittest.TestCase):
+    """Only errors about the response format should turn structured output off"""
+
+    def setUp(self):
+        patcher = mock.patch.dict(sys.modules, {"openai": FAKE_OPENAI})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_errors_naming_the_parameter_are_rejections(self):
+        self.assertTrue(ideas.is_response_format_rejected(
+            FakeBadRequestError("Error code: 400 - response_format is not supported by this model")))
+        self.assertTrue(ideas.is_response_format_rejected(
+            FakeUnprocessableEntityError("Error code: 422", body={"detail": "Unknown field json_schema"})))
+        self.assertTrue(ideas.is_response_format_rejected(
+            FakeNotFoundError("Error code: 404 - 'response_format' unsupported")))
+
+    def test_other_status_errors_are_not(self):
+        self.assertFalse(ideas.is_response_format_rejected(
+            FakeBadRequestError("Error code: 400 - maximum context length is 8192 tokens")))
+        self.assertFalse(ideas.is_response_format_rejected(
+            FakeNotFoundError("Error code: 404 - model 'gpt-9' does not exist")))
+        self.assertFalse(ideas.is_response_format_rejected(
+            FakeUnprocessableEntityError("Error code: 422 - temperature must be <= 2")))
+
+    def test_non_api_errors_are_not(self):
+        self.assertFalse(ideas.is_response_format_rejected(ValueError("response_format")))
+
+
+class DropDuplicateIdeasTest(unittest.TestCase):
+    """New ideas at or above DUPLICATE_SIMILARITY to a saved idea are dropped"""
+
+    def setUp(self):
+        self.ideas = [{"idea": "cats"}, {"idea": "dogs"}, {"idea": "more cats"}]
+
+    def test_off_by_default_returns_ideas_untouched(self):
+        with mock.patch.object(ideas, "DEDUPLICATE_IDEAS", False), \
+                mock.patch.object(ideas, "embed_texts") as embed_texts:
+            kept, embeddings = ideas.drop_duplicate_ideas(self.ideas, 5)
+
+        self.assertIs(kept, self.ideas)
+        self.assertIsNone(embeddings)
+        embed_texts.assert_not_called()
+
+    def test_keep_drop_mask(self):
+        import numpy as np
+
+        new = np.array([[1.0, 0.0], [0.0, 1.0], [0.8, 0.6]])
+        existing = np.array([[1.0, 0.0]])
+        with mock.patch.object(ideas, "DEDUPLICATE_IDEAS", True), \
+                mock.patch.object(ideas, "DUPLICATE_SIMILARITY", 0.85), \
+                mock.patch.object(ideas, "embed_texts", return_value=new), \
+                mock.patch.object(ideas, "load_idea_embeddings", return_value=existing):
+            kept, embeddings = ideas.drop_duplicate_ideas(self.ideas, 1)
+
+        # Similarities to the saved idea are 1.0, 0.0 and 0.8
+        self.assertEqual(kept, [{"idea": "dogs"}, {"idea": "more cats"}])
+        np.testing.assert_array_equal(embeddings, new[[1, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ideas
+import main
+
+
+IDEAS = [
+    {"id": 1, "idea": "first", "publishing_status": "published"},
+    {"id": 2, "idea": "second", "publishing_status": "pending"},
+    {"id": 3, "idea": "third", "publishing_status": "pending"},
+]
+
+
+class IdeasJournalTest(unittest.TestCase):
+    """Status updates go to ideas.journal and are replayed over ideas.json until compacted"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "ideas.json")
+        self.journal_path = ideas.journal_path_for(self.path)
+        ideas.write_json_file(self.path, IDEAS)
+
+    def read_file(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_updates_are_journaled_and_replayed(self):
+        main._IdeasStore(self.path).update(2, publishing_status="error", error_log="boom")
+
+        # ideas.json is untouched; a fresh reader sees the update through the journal
+        self.assertEqual(self.read_file(), IDEAS)
+        replayed = main._IdeasStore(self.path).with_status("error")
+        self.assertEqual([idea["id"] for idea in replayed], [2])
+        self.assertEqual(replayed[0]["error_log"], "boom")
+        self.assertEqual(main._IdeasStore(self.path).first_pending(), 3)
+
+    def test_replay_skips_a_damaged_line(self):
+        ideas.append_journal_entry(self.journal_path, 2, {"publishing_status": "error"})
+        with open(self.journal_path, "ab") as f:
+            f.write(b'{"id": 3, "publishing_sta')
+
+        by_id = {idea["id"]: dict(idea) for idea in IDEAS}
+        self.assertEqual(ideas.replay_journal(self.journal_path, by_id), 1)
+        self.assertEqual(by_id[2]["publishing_status"], "error")
+        self.assertEqual(by_id[3]["publishing_status"], "pending")
+
+    def test_compacts_after_enough_entries(self):
+        store = main._IdeasStore(self.path)
+        with mock.patch.object(main, "JOURNAL_COMPACT_EVERY", 3):
+            store.update(2, publishing_status="in_progress")
+            store.update(2, final_output="story_board/second.json")
+            self.assertTrue(os.path.exists(self.journal_path))
+            store.update(3, publishing_status="error")
+
+        self.assertFalse(os.path.exists(self.journal_path))
+        saved = {idea["id"]: idea for idea in self.read_file()}
+        self.assertEqual(saved[2]["publishing_status"], "in_progress")
+        self.assertEqual(saved[2]["final_output"], "story_board/second.json")
+        self.assertEqual(saved[3]["publishing_status"], "error")
+        self.assertIsNone(main._IdeasStore(self.path).first_pending())
+
+    def test_compact_folds_the_journal_into_the_file(self):
+        store = main._IdeasStore(self.path)
+        store.update(3, publishing_status="published")
+        store.compact()
+
+        self.assertFalse(os.path.exists(self.journal_path))
+        self.assertEqual(self.read_file()[2]["publishing_status"], "published")
+        self.assertEqual(main._IdeasStore(self.path).first_pending(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
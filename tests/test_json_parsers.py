@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ideas
+
+try:
+    import story
+except ImportError:  # story.py sets up its API client at import
+    story = None
+
+
+RESPONSE = (
+    'Here are the ideas, e.g. [1, 2]:\n```json\n'
+    '[{"id": 1, "idea": "Why [brackets] matter", "caption": "a \\"quoted\\" } brace"},\n'
+    ' {"id": 2, "idea": "Nested", "tags": [["a"], ["b"]]}]\n'
+    '```\nHope that helps [really].'
+)
+EXPECTED = [
+    {"id": 1, "idea": "Why [brackets] matter", "caption": 'a "quoted" } brace'},
+    {"id": 2, "idea": "Nested", "tags": [["a"], ["b"]]},
+]
+PAYLOAD = RESPONSE[RESPONSE.index('[{'):RESPONSE.index(']\n```') + 1]
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StreamingArrayParserTest(unittest.TestCase):
+    """Items come out as soon as they're complete, whatever the chunk boundaries"""
+
+    def test_items_across_chunk_boundaries(self):
+        text = "Sure!\n" + PAYLOAD + "\nDone."
+        for size in (1, 3, 7, len(text)):
+            with self.subTest(size=size):
+                parser = ideas.StreamingArrayParser()
+                items = []
+                for chunk in chunks(text, size):
+                    items.extend(parser.feed(chunk))
+
+                self.assertEqual(items, EXPECTED)
+                self.assertTrue(parser.closed)
+                self.assertFalse(parser.failed)
+
+    def test_non_object_items_fail_over_to_a_full_parse(self):
+        parser = ideas.StreamingArrayParser()
+        self.assertEqual(parser.feed("[1, 2]"), [])
+        self.assertTrue(parser.failed)
+
+
+@unittest.skipIf(story is None, "story.py needs its API client package")
+class JsonArrayScannerTest(unittest.TestCase):
+    """Top-level arrays are found by bracket depth, ignoring brackets inside strings"""
+
+    def test_arrays_across_chunk_boundaries(self):
+        for size in (1, 5, len(RESPONSE)):
+            with self.subTest(size=size):
+                scanner = story.JsonArrayScanner()
+                found = []
+                for chunk in chunks(RESPONSE, size):
+                    found.extend(scanner.feed(chunk))
+
+                # The bracketed aside in the prose doesn't parse, so it isn't reported
+                self.assertEqual([value for _, value in found], [[1, 2], EXPECTED])
+                self.assertEqual(found[1][0], PAYLOAD)
+
+    def test_find_json_array_prefers_the_longest(self):
+        self.assertEqual(json.loads(story.find_json_array(RESPONSE)), EXPECTED)
+        self.assertIsNone(story.find_json_array("no arrays here"))
+
+    def test_parse_storyboard_batch_ignores_inline_examples(self):
+        response = (
+            'Format: [{"id": 0, "storyboard": []}]\n'
+            '[{"id": 7, "storyboard": [{"text": "a ] b"}]}, {"id": 8, "storyboard": "bad"}]\n'
+            'Thanks [end]'
+        )
+        self.assertEqual(story.parse_storyboard_batch(response), {7: [{"text": "a ] b"}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
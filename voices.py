@@ -5,6 +5,14 @@ import shutil
 from dotenv import load_dotenv
 from pathlib import Path
 import time  # Added for retry delays
+import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import orjson  # Optional: faster JSON load/save for storyboards and audio metadata
+except ImportError:
+    orjson = None
 
 
 
@@ -19,6 +27,29 @@ TTS_ENGINE = os.getenv("TTS_ENGINE", "kokoro").lower()
 
 
 
+# Dialogue lines sent to the TTS API at once (each request mostly waits on the network)
+TTS_MAX_CONCURRENCY = max(1, int(os.getenv("TTS_MAX_CONCURRENCY", "8")))
+
+
+
+# Keep every generated line under .cache/tts so re-runs skip identical TTS requests
+TTS_CACHE = os.getenv("TTS_CACHE", "no").lower() == "yes"
+TTS_CACHE_DIR = os.path.join(".cache", "tts")
+
+
+# Retry delays grow 1s, 2s, 4s with +/-50% jitter so concurrent lines don't retry in lockstep
+RETRY_MAX_DELAY = 8.0
+# Bad arguments or response shapes fail the same way on every attempt. Transient Space
+# failures (queue full, restarts) surface from gradio_client as generic errors, so those retry
+NON_RETRYABLE_ERRORS = (TypeError, KeyError, IndexError, AttributeError, FileNotFoundError)
+
+
+def retry_delay(attempt):
+    """Seconds to wait before retry number attempt + 1: capped, jittered exponential backoff"""
+    return min(RETRY_MAX_DELAY, random.uniform(0.5, 1.5) * (2 ** attempt))
+
+
+
 print(f"🔊 TTS Engine: {TTS_ENGINE.upper()}")
 
 
@@ -58,37 +89,48 @@ if TTS_ENGINE == "chatterbox":
                 self._connect()
             
             def _connect(self):
-                """Connect to available API"""
-                # Try backup first (Chatterbox - more reliable)
-                try:
-                    self.backup_client = Client(self.BACKUP_SPACE)
-                    self.current_api = "backup"
-                    print("✓ Chatterbox TTS connected")
-                    return
-                except:
-                    pass
+                """Connect to both APIs at once and use whichever answers first
                 
-                # Try primary
-                try:
-                    self.primary_client = Client(self.PRIMARY_SPACE)
-                    self.current_api = "primary"
-                    print("✓ Multilingual TTS connected")
-                    return
-                except:
-                    pass
+                The slower connection is still stored when it arrives, so generate()
+                can fall back to it.
+                """
+                spaces = {"backup": self.BACKUP_SPACE, "primary": self.PRIMARY_SPACE}
+                connected = {"backup": "✓ Chatterbox TTS connected", "primary": "✓ Multilingual TTS connected"}
+                
+                executor = ThreadPoolExecutor(max_workers=len(spaces))
+                probes = {executor.submit(Client, space): api for api, space in spaces.items()}
+                executor.shutdown(wait=False)
+                for probe, api in probes.items():
+                    probe.add_done_callback(lambda probe, api=api: self._store_client(api, probe))
+                
+                pending = set(probes)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    # Prefer backup (Chatterbox - more reliable) when both answered together
+                    for probe in sorted(done, key=lambda probe: probes[probe] != "backup"):
+                        if probe.exception() is None:
+                            self._store_client(probes[probe], probe)
+                            self.current_api = probes[probe]
+                            print(connected[self.current_api])
+                            return
                 
                 raise ConnectionError("Failed to connect to any TTS API")
             
+            def _store_client(self, api, probe):
+                """Keep a finished connection attempt's client, if it succeeded"""
+                if not probe.cancelled() and probe.exception() is None:
+                    setattr(self, f"{api}_client", probe.result())
+            
             def _retry_predict(self, client, predict_args, max_retries=3):
                 """Helper for retrying predict calls with exponential backoff"""
                 for attempt in range(max_retries):
                     try:
                         return client.predict(**predict_args)
                     except Exception as e:
-                        if attempt == max_retries - 1:
+                        if attempt == max_retries - 1 or isinstance(e, NON_RETRYABLE_ERRORS):
                             raise e
-                        wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                        print(f"    Retry {attempt + 1}/{max_retries} after {wait_time}s delay: {str(e)[:50]}...")
+                        wait_time = retry_delay(attempt)
+                        print(f"    Retry {attempt + 1}/{max_retries} after {wait_time:.1f}s delay: {str(e)[:50]}...")
                         time.sleep(wait_time)
                 
                 raise RuntimeError("All retry attempts failed")
@@ -184,15 +226,64 @@ CHATTERBOX_VOICE_MAP = {
     "Person 2": "assets/person_2.mp3"
 }
 
+# Speaker -> reference audio path, or None when the file is missing (default voice)
+VALIDATED_REFERENCE_AUDIO = {}
 
 
+def validate_reference_audio(warn=False):
+    """Check which reference audio files exist, so generating a line needs no file checks"""
+    for speaker, ref_audio in CHATTERBOX_VOICE_MAP.items():
+        exists = os.path.exists(ref_audio)
+        VALIDATED_REFERENCE_AUDIO[speaker] = ref_audio if exists else None
+        if warn and not exists:
+            print(f"⚠️  Warning: Reference audio missing for {speaker}: {ref_audio}")
+            print(f"   Place voice samples in the 'assets' folder:")
+            print(f"   - assets/person_1.mp3")
+            print(f"   - assets/person_2.mp3")
+            print(f"   Using default voice...")
 
-def load_storyboard(file_path):
-    """Load storyboard from JSON file"""
+
+validate_reference_audio()
+
+
+
+
+def load_json(file_path):
+    """Load a JSON file, using orjson when it is installed"""
+    if orjson:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
+def save_json(file_path, data):
+    """Write data as indented UTF-8 JSON atomically, using orjson when it is installed
+    
+    Readers either see the previous file or the complete new one, so a crash
+    mid-write can't leave a truncated audio_metadata.json that looks finished.
+    """
+    if orjson:
+        data_bytes = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data_bytes = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb', buffering=65536) as f:
+            f.write(data_bytes)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_storyboard(file_path):
+    """Load storyboard from JSON file"""
+    return load_json(file_path)
+
+
 
 
 def generate_audio_kokoro(text, voice, speed=1.0):
@@ -217,10 +308,12 @@ def generate_audio_kokoro(text, voice, speed=1.0):
             return audio_path, phonemes
         
         except Exception as e:
+            if isinstance(e, NON_RETRYABLE_ERRORS):
+                raise Exception(f"Kokoro TTS generation failed: {str(e)}")
             if attempt == max_retries - 1:
                 raise Exception(f"Kokoro TTS generation failed after {max_retries} attempts: {str(e)}")
-            wait_time = 2 ** attempt  # Exponential backoff
-            print(f"    Kokoro retry {attempt + 1}/{max_retries} after {wait_time}s: {str(e)[:50]}...")
+            wait_time = retry_delay(attempt)
+            print(f"    Kokoro retry {attempt + 1}/{max_retries} after {wait_time:.1f}s: {str(e)[:50]}...")
             time.sleep(wait_time)
 
 
@@ -232,12 +325,7 @@ def generate_audio_chatterbox(text, reference_audio):
         raise Exception("Chatterbox TTS not initialized")
     
     try:
-        # Check if reference audio exists
-        if not os.path.exists(reference_audio):
-            print(f"⚠️  Reference audio not found: {reference_audio}")
-            print(f"   Using default voice...")
-            reference_audio = None
-        
+        # reference_audio comes from VALIDATED_REFERENCE_AUDIO: None when the file is missing
         # ========== FIXED: generate() returns a single value, not a tuple ==========
         audio_path = unified_tts_client.generate(
             text=text,
@@ -254,6 +342,87 @@ def generate_audio_chatterbox(text, reference_audio):
 
 
 
+def _move_or_copy(src, dst, keep_source=False):
+    """Put a generated audio file at dst: rename it, else hardlink it, and only copy across filesystems"""
+    if not keep_source:
+        try:
+            os.replace(src, dst)
+            return
+        except OSError:
+            pass
+    try:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, length=1024 * 1024)
+
+
+def dump_json_line(record):
+    """One compact JSON line, as bytes"""
+    if orjson:
+        return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n"
+
+
+def audio_filename(scene, line_idx, dialogue):
+    """Meaningful filename of a dialogue line's audio"""
+    return f"scene_{scene.get('scene_id'):02d}_line_{line_idx + 1:02d}_{dialogue.get('speaker').replace(' ', '_').lower()}.wav"
+
+
+def load_audio_progress(progress_path, folder):
+    """Records of lines an interrupted run already saved, by audio file, if the file is still there"""
+    finished = {}
+    try:
+        with open(progress_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line) if orjson else json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by the interruption
+                if os.path.exists(os.path.join(folder, record.get('audio_file', ''))):
+                    finished[record['audio_file']] = record
+    except FileNotFoundError:
+        pass
+    return finished
+
+
+def tts_cache_key(*parts):
+    """SHA256 of everything that decides what a TTS request sounds like"""
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def load_cached_audio(key):
+    """(audio_path, metadata) cached under this key, or None"""
+    audio_path = os.path.join(TTS_CACHE_DIR, f"{key}.wav")
+    try:
+        metadata = load_json(os.path.join(TTS_CACHE_DIR, f"{key}.json"))
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(audio_path):
+        return None
+    return audio_path, metadata
+
+
+def cache_audio(key, audio_path, metadata):
+    """Move a generated line into the TTS cache and return where it now lives
+
+    The metadata file is written last so it marks a complete entry.
+    """
+    cached_path = os.path.join(TTS_CACHE_DIR, f"{key}.wav")
+    try:
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        _move_or_copy(audio_path, cached_path)
+        save_json(os.path.join(TTS_CACHE_DIR, f"{key}.json"), metadata)
+    except OSError as e:
+        print(f"    ⚠️  Could not cache audio: {e}")
+        return audio_path if os.path.exists(audio_path) else cached_path
+    return cached_path
+
+
 def generate_audio(text, speaker, speed=1.0):
     """
     Universal audio generation function that works with both TTS engines
@@ -268,18 +437,28 @@ def generate_audio(text, speaker, speed=1.0):
     """
     if TTS_ENGINE == "kokoro":
         voice = KOKORO_VOICE_MAP.get(speaker, "bm_daniel")
+        key = tts_cache_key(TTS_ENGINE, voice, speed, text)
+        cached = load_cached_audio(key) if TTS_CACHE else None
+        if cached:
+            return cached
         audio_path, phonemes = generate_audio_kokoro(text, voice, speed)
         metadata = {"phonemes": phonemes, "voice": voice, "engine": "kokoro"}
-        return audio_path, metadata
     
     elif TTS_ENGINE == "chatterbox":
-        reference_audio = CHATTERBOX_VOICE_MAP.get(speaker)
+        reference_audio = VALIDATED_REFERENCE_AUDIO.get(speaker)
+        key = tts_cache_key(TTS_ENGINE, reference_audio, text)
+        cached = load_cached_audio(key) if TTS_CACHE else None
+        if cached:
+            return cached
         audio_path, _ = generate_audio_chatterbox(text, reference_audio)
         metadata = {"reference_audio": reference_audio, "engine": "chatterbox"}
-        return audio_path, metadata
     
     else:
         raise ValueError(f"Unknown TTS engine: {TTS_ENGINE}")
+    
+    if TTS_CACHE:
+        audio_path = cache_audio(key, audio_path, metadata)
+    return audio_path, metadata
 
 
 
@@ -302,76 +481,116 @@ def process_storyboard_audio(storyboard_path, output_folder="audio_output"):
     if TTS_ENGINE == "chatterbox":
         os.makedirs("assets", exist_ok=True)
             
-        # Check if reference audio files exist
-        for speaker, ref_audio in CHATTERBOX_VOICE_MAP.items():
-            if not os.path.exists(ref_audio):
-                print(f"⚠️  Warning: Reference audio missing for {speaker}: {ref_audio}")
-                print(f"   Place voice samples in the 'assets' folder:")
-                print(f"   - assets/person_1.mp3")
-                print(f"   - assets/person_2.mp3")
+        # Check once per storyboard, picking up voice samples added since the last run
+        validate_reference_audio(warn=True)
     
     audio_metadata = []
-    total_lines = sum(len(scene.get('dialogue_lines', [])) for scene in storyboard)
-    current_line = 0
+    # One flat pass over the storyboard: (scene, line index, dialogue) per dialogue line
+    flat_lines = [
+        (scene, line_idx, dialogue)
+        for scene in storyboard
+        for line_idx, dialogue in enumerate(scene.get('dialogue_lines') or ())
+    ]
+    total_lines = len(flat_lines)
+    
+    # Each saved line is appended here as it finishes, so an interrupted run keeps its progress;
+    # audio_metadata.json is only written once every line has been handled
+    progress_path = os.path.join(specific_output_folder, "audio_metadata.jsonl")
+    finished = load_audio_progress(progress_path, specific_output_folder)
+    
+    def already_saved(scene, line_idx, dialogue):
+        """The record of this exact line from an interrupted run, or None"""
+        record = finished.get(audio_filename(scene, line_idx, dialogue))
+        if record and record.get('speaker') == dialogue.get('speaker') and record.get('text') == dialogue.get('line'):
+            return record
+        return None
     
     print(f"\n{'='*60}")
     print(f"Processing {len(storyboard)} scenes with {total_lines} dialogue lines")
     print(f"TTS Engine: {TTS_ENGINE.upper()}")
     print(f"{'='*60}\n")
     
-    # Process each scene
-    for scene in storyboard:
+    # Request every distinct line at once; results are collected below in storyboard order.
+    # A speaker repeating a line ("Wait, what?") shares the first occurrence's request
+    executor = ThreadPoolExecutor(max_workers=max(1, min(TTS_MAX_CONCURRENCY, total_lines)))
+    requests_by_line = {}
+    for scene, line_idx, dialogue in flat_lines:
+        key = (dialogue.get('speaker'), (dialogue.get('line') or '').strip().lower())
+        if key not in requests_by_line and not already_saved(scene, line_idx, dialogue):
+            requests_by_line[key] = executor.submit(generate_audio, dialogue.get('line'), dialogue.get('speaker'), 1.0)
+    saved_files = {}  # Request -> the first file its audio was saved as
+    progress = open(progress_path, 'ab', buffering=65536)
+    
+    # Process each dialogue line
+    for current_line, (scene, line_idx, dialogue) in enumerate(flat_lines, 1):
         scene_id = scene.get('scene_id')
         topic_focus = scene.get('topic_focus', 'unknown')
         audio_style = scene.get('audio_style', 'neutral')
-        dialogue_lines = scene.get('dialogue_lines', [])
         
-        print(f"Scene {scene_id}: {topic_focus} ({audio_style})")
+        if line_idx == 0:
+            if current_line > 1:
+                print()  # Empty line between scenes
+            print(f"Scene {scene_id}: {topic_focus} ({audio_style})")
         
-        # Process each dialogue line
-        for line_idx, dialogue in enumerate(dialogue_lines):
-            current_line += 1
-            speaker = dialogue.get('speaker')
-            text = dialogue.get('line')
+        speaker = dialogue.get('speaker')
+        text = dialogue.get('line')
+        
+        print(f"  [{current_line}/{total_lines}] {speaker}: {text[:50]}{'...' if len(text) > 50 else ''}")
+        
+        record = already_saved(scene, line_idx, dialogue)
+        if record:
+            audio_metadata.append(record)
+            print(f"      ✓ Already saved: {record['audio_file']}")
+            continue
+        
+        request = requests_by_line[(speaker, (text or '').strip().lower())]
+        
+        try:
+            # Wait for this line's audio from the universal generation function
+            audio_path, metadata = request.result()
             
-            print(f"  [{current_line}/{total_lines}] {speaker}: {text[:50]}{'...' if len(text) > 50 else ''}")
+            # Create meaningful filename
+            filename = audio_filename(scene, line_idx, dialogue)
+            destination = os.path.join(specific_output_folder, filename)
             
-            try:
-                # Generate audio using universal function
-                audio_path, metadata = generate_audio(text, speaker, speed=1.0)
-                
-                # Create meaningful filename
-                filename = f"scene_{scene_id:02d}_line_{line_idx + 1:02d}_{speaker.replace(' ', '_').lower()}.wav"
-                destination = os.path.join(specific_output_folder, filename)
-                
-                # Copy audio file to output folder
-                shutil.copy(audio_path, destination)
-                
-                # Store metadata
-                audio_metadata.append({
-                    "scene_id": scene_id,
-                    "topic_focus": topic_focus,
-                    "audio_style": audio_style,
-                    "line_number": line_idx + 1,
-                    "speaker": speaker,
-                    "text": text,
-                    "audio_file": filename,
-                    "tts_engine": TTS_ENGINE,
-                    **metadata  # Include engine-specific metadata
-                })
-                
-                print(f"      ✓ Saved: {filename}")
-                
-            except Exception as e:
-                print(f"      ✗ Error after retries: {str(e)}")
-                continue
-        
-        print()  # Empty line between scenes
+            # Move audio file to output folder; repeated lines link to the first copy
+            if request in saved_files:
+                _move_or_copy(saved_files[request], destination, keep_source=True)
+            else:
+                _move_or_copy(audio_path, destination, keep_source=TTS_CACHE)
+                saved_files[request] = destination
+            
+            # Store metadata
+            record = {
+                "scene_id": scene_id,
+                "topic_focus": topic_focus,
+                "audio_style": audio_style,
+                "line_number": line_idx + 1,
+                "speaker": speaker,
+                "text": text,
+                "audio_file": filename,
+                "tts_engine": TTS_ENGINE,
+                **metadata  # Include engine-specific metadata
+            }
+            audio_metadata.append(record)
+            progress.write(dump_json_line(record))
+            progress.flush()
+            
+            print(f"      ✓ Saved: {filename}")
+            
+        except Exception as e:
+            print(f"      ✗ Error after retries: {str(e)}")
+    
+    if flat_lines:
+        print()
+    
+    executor.shutdown()
+    progress.close()
     
     # Save metadata
     metadata_path = os.path.join(specific_output_folder, "audio_metadata.json")
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(audio_metadata, f, indent=2, ensure_ascii=False)
+    save_json(metadata_path, audio_metadata)
+    os.remove(progress_path)
     
     print(f"{'='*60}")
     print(f"Audio generation complete!")
@@ -391,18 +610,17 @@ def find_latest_storyboard(storyboard_folder="story_board"):
     if not os.path.exists(storyboard_folder):
         return None
     
-    json_files = [f for f in os.listdir(storyboard_folder) if f.endswith('.json')]
-    
-    if not json_files:
-        return None
-    
-    # Get the most recent file
-    latest_file = max(
-        json_files,
-        key=lambda f: os.path.getmtime(os.path.join(storyboard_folder, f))
-    )
+    # DirEntry objects come from the directory read, so only the mtime needs a stat per entry
+    with os.scandir(storyboard_folder) as entries:
+        json_files = [entry for entry in entries if entry.name.endswith('.json') and entry.is_file()]
+        
+        if not json_files:
+            return None
+        
+        # Get the most recent file
+        latest_file = max(json_files, key=lambda entry: entry.stat().st_mtime_ns)
     
-    return os.path.join(storyboard_folder, latest_file)
+    return latest_file.path
 
 
 
@@ -443,7 +661,7 @@ def test_tts_engine():
             
             # Save test audio
             destination = f"test_audio/{speaker.replace(' ', '_').lower()}_test.wav"
-            shutil.copy(audio_path, destination)
+            _move_or_copy(audio_path, destination, keep_source=TTS_CACHE)
             
             print(f"  ✓ Success: {destination}")
             print(f"  Metadata: {metadata}\n")